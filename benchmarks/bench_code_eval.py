@@ -0,0 +1,33 @@
+import timeit
+
+from static_topo_impl.dsl.compiler import compile_code, normalize_code
+from static_topo_impl.dsl.interpreter import CodeEvaluator, TopologyContext
+from static_topo_impl.model.factory import TopologyFactory
+
+CODE = """
+       name = "host-%d" % repeat_index
+       "urn:host:%s" % name.lower()
+```"""
+EVALUATIONS = 20000
+
+
+def main():
+    evaluator = CodeEvaluator()
+    ctx = TopologyContext(factory=TopologyFactory())
+    compiled = compile_code(CODE)
+
+    def reparse():
+        evaluator.bind(ctx).eval(normalize_code(CODE))
+
+    def precompiled():
+        CodeEvaluator.run(evaluator.bind(ctx), compiled)
+
+    before = min(timeit.repeat(reparse, number=EVALUATIONS, repeat=3))
+    after = min(timeit.repeat(precompiled, number=EVALUATIONS, repeat=3))
+    print(f"normalize + parse + run : {EVALUATIONS / before:12,.0f} evaluations/s")
+    print(f"precompiled run         : {EVALUATIONS / after:12,.0f} evaluations/s")
+    print(f"speedup                 : {before / after:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import time
+import tracemalloc
+
+from static_topo_impl.model import elements, stackstate
+
+
+def build(module, size: int):
+    topology = []
+    for i in range(size):
+        component = module.Component()
+        component.uid = f"urn:host:host-{i}"
+        component.set_type("Host")
+        component.set_name(f"host-{i}")
+        component.properties.labels.extend(["env:prod", f"index:{i}"])
+        component.properties.identifiers.append(component.uid)
+        component.properties.update_properties({"cpu": 4, "index": i})
+        relation = module.Relation()
+        relation.source_id = component.uid
+        relation.target_id = "urn:host:host-0"
+        relation.external_id = f"{component.uid} --> urn:host:host-0"
+        relation.set_type("uses")
+        component.relations.append(relation)
+
+        health = module.HealthCheckState()
+        health.check_id = f"host-{i}_static_states"
+        health.check_name = "HealthCheck"
+        health.topo_identifier = component.uid
+        health.health = "CLEAR"
+        health.message = ""
+        health.validate()
+        topology.append((component, health))
+    return topology
+
+
+def measure(module, size: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    topology = build(module, size)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del topology
+    return current / size, size / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and build throughput, schematics models versus records")
+    parser.add_argument("--size", default=100000, type=int, help="Components, each with a relation and health state")
+    args = parser.parse_args()
+
+    print(f"{'elements':>10} {'bytes/component':>16} {'components/s':>13}")
+    for name, module in [("schematics", stackstate), ("records", elements)]:
+        per_component, throughput = measure(module, args.size)
+        print(f"{name:>10} {per_component:>16,.0f} {throughput:>13,.0f}")
+
+
+if __name__ == "__main__":
+    main()
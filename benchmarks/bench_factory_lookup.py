@@ -0,0 +1,55 @@
+import argparse
+import time
+
+from static_topo_impl.model.elements import Component
+from static_topo_impl.model.factory import TopologyFactory
+
+SCAN_LOOKUPS = 20
+
+
+def build_factory(size: int) -> TopologyFactory:
+    factory = TopologyFactory()
+    for i in range(size):
+        component = Component()
+        component.uid = f"urn:host:host-{i}"
+        component.set_type("Host")
+        component.set_name(f"host-{i}")
+        factory.add_component(component)
+    return factory
+
+
+def scan_by_name(factory: TopologyFactory, name: str) -> Component:
+    return [c for c in factory.components.values() if c.get_name() == name][0]
+
+
+def rate(lookups: int, seconds: float) -> float:
+    return lookups / seconds if seconds > 0 else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Name lookup scaling of TopologyFactory")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated component counts")
+    args = parser.parse_args()
+
+    print(f"{'components':>12} {'build s':>10} {'indexed lookups/s':>20} {'scan lookups/s':>16}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        start = time.perf_counter()
+        factory = build_factory(size)
+        build = time.perf_counter() - start
+
+        names = [f"host-{i}" for i in range(0, size, max(1, size // 10000))]
+        start = time.perf_counter()
+        for name in names:
+            factory.get_component_by_name(name)
+            factory.get_component_by_name_and_type("Host", name)
+        indexed = rate(2 * len(names), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for name in names[:SCAN_LOOKUPS]:
+            scan_by_name(factory, name)
+        scan = rate(min(SCAN_LOOKUPS, len(names)), time.perf_counter() - start)
+        print(f"{size:>12} {build:>10.2f} {indexed:>20,.0f} {scan:>16,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import timeit
+
+from static_topo_impl.dsl import interpreter as dsl
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.model.factory import TopologyFactory
+from textx import metamodel_from_str
+
+ROUNDS = 50
+
+
+def cold_start():
+    dsl._topology_meta = None
+    return TopologyInterpreter(TopologyFactory())
+
+
+def warm_start():
+    return TopologyInterpreter(TopologyFactory())
+
+
+def main():
+    dsl.get_topology_metamodel()
+    grammar = min(timeit.repeat(lambda: metamodel_from_str(dsl.TOPOLOGY_TX), number=1, repeat=ROUNDS))
+    cold = min(timeit.repeat(cold_start, number=1, repeat=ROUNDS))
+    warm = min(timeit.repeat(warm_start, number=1, repeat=ROUNDS))
+    print(f"grammar construction : {grammar * 1000:10.3f} ms")
+    print(f"cold interpreter     : {cold * 1000:10.3f} ms")
+    print(f"warm interpreter     : {warm * 1000:10.3f} ms")
+    print(f"speedup              : {cold / warm:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from static_topo_impl.model.elements import (Component, Event,
+                                             HealthCheckState, Relation)
+from static_topo_impl.model.instance import StackStateSpec
+from static_topo_impl.model.stackstate_receiver import SyncStats
+from static_topo_impl.stackstate import StackStateClient
+
+
+class LatencyReceiver(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def build_topology(size: int):
+    components, relations, health = [], [], []
+    for i in range(size):
+        component = Component()
+        component.uid = f"urn:host:host-{i}"
+        component.set_type("Host")
+        component.set_name(f"host-{i}")
+        components.append(component)
+
+        relation = Relation(source_id=component.uid, target_id="urn:host:host-0", external_id=f"rel-{i}")
+        relation.set_type("uses")
+        relations.append(relation)
+
+        health_state = HealthCheckState()
+        health_state.check_id = f"host-{i}_static_states"
+        health_state.check_name = "HealthCheck"
+        health_state.topo_identifier = component.uid
+        health_state.health = "CLEAR"
+        health_state.message = ""
+        health.append(health_state)
+    event = Event()
+    event.event_type = "Topology Published"
+    event.msg_title = "published"
+    event.msg_text = ""
+    return components, relations, health, [event]
+
+
+def publish(port: int, concurrency: int, batch_elements: int, topology) -> SyncStats:
+    spec = StackStateSpec(
+        {
+            "receiver_url": f"http://127.0.0.1:{port}",
+            "api_key": "xxx",
+            "instance_type": "static_topo_dsl",
+            "instance_url": "bench",
+            "max_batch_elements": batch_elements,
+            "max_concurrency": concurrency,
+            "health_sync": {"stream_id": "bench"},
+        }
+    )
+    return StackStateClient(spec).publish_all(*topology, stats=SyncStats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish wall time against a receiver with injected latency")
+    parser.add_argument("--size", default=2000, type=int, help="Components (and relations and health checks)")
+    parser.add_argument("--batch-elements", default=250, type=int, help="Elements per topology batch")
+    parser.add_argument("--latency", default=0.05, type=float, help="Receiver latency per request in seconds")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma separated concurrency limits")
+    args = parser.parse_args()
+
+    LatencyReceiver.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LatencyReceiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    topology = build_topology(args.size)
+    try:
+        print(f"{'concurrency':>12} {'requests':>9} {'wall ms':>10} {'speedup':>8}")
+        baseline = None
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            start = time.perf_counter()
+            stats = publish(server.server_port, concurrency, args.batch_elements, topology)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{concurrency:>12} {stats.requests:>9} {elapsed * 1000:>10.1f} {baseline / elapsed:>7.1f}x")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
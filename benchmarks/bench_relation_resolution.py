@@ -0,0 +1,44 @@
+import argparse
+import time
+
+from static_topo_impl.dsl.resolver import RelationResolver
+from static_topo_impl.model.elements import Component, Relation
+from static_topo_impl.model.factory import TopologyFactory
+
+
+def build_factory(size: int, fan_out: int) -> TopologyFactory:
+    factory = TopologyFactory()
+    for i in range(size):
+        component = Component()
+        component.uid = f"urn:host:host-{i}"
+        component.set_type("Host")
+        component.set_name(f"host-{i}")
+        for j in range(1, fan_out + 1):
+            # Alternate references by uid and by name.
+            target = (i + j) % size
+            target_id = f"urn:host:host-{target}" if j % 2 else f"host-{target}"
+            relation = Relation(source_id=component.uid, target_id=target_id, external_id="")
+            relation.set_type("uses")
+            component.relations.append(relation)
+        factory.add_component(component)
+    return factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relation resolution time by topology size")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Comma separated component counts")
+    parser.add_argument("--fan-out", default=4, type=int, help="Relations per component")
+    args = parser.parse_args()
+
+    print(f"{'components':>11} {'edges':>9} {'resolve ms':>11} {'us/edge':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        factory = build_factory(size, args.fan_out)
+        start = time.perf_counter()
+        RelationResolver(factory).resolve(factory.components.values())
+        elapsed = time.perf_counter() - start
+        edges = len(factory.relations)
+        print(f"{size:>11} {edges:>9} {elapsed * 1000:>11.1f} {elapsed * 1e6 / edges:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
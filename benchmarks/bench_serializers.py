@@ -0,0 +1,74 @@
+import argparse
+import time
+from datetime import datetime
+
+from static_topo_impl.model.serializers import (component_to_primitive,
+                                                event_to_primitive,
+                                                health_to_primitive,
+                                                relation_to_primitive)
+from static_topo_impl.model.stackstate import (Component, Event,
+                                               HealthCheckState, Relation)
+
+
+def build_elements(size: int):
+    components, relations, health, events = [], [], [], []
+    for i in range(size):
+        component = Component()
+        component.uid = f"urn:host:host-{i}"
+        component.set_type("Host")
+        component.set_name(f"host-{i}")
+        component.properties.labels.extend(["env:prod", f"index:{i}"])
+        component.properties.identifiers.append(component.uid)
+        component.properties.update_properties({"cpu": 4, "tags": ["a", "b"], "nested": {"x": i}})
+        components.append(component)
+
+        relation = Relation({"source_id": component.uid, "target_id": "urn:host:host-0", "external_id": f"rel-{i}"})
+        relation.set_type("uses")
+        relations.append(relation)
+
+        health_state = HealthCheckState()
+        health_state.check_id = f"host-{i}_static_states"
+        health_state.check_name = "HealthCheck"
+        health_state.topo_identifier = component.uid
+        health_state.health = "CLEAR"
+        health_state.message = ""
+        health.append(health_state)
+
+        event = Event()
+        event.event_type = "Element Properties Changed"
+        event.msg_title = f"host-{i} patched"
+        event.msg_text = ""
+        event.timestamp = datetime.now()
+        event.context.category = "Changes"
+        event.context.element_identifiers = [component.uid]
+        event.context.data = {"old": {"v": 1}, "new": {"v": 2}}
+        events.append(event)
+    return [
+        ("component", components, lambda e: e.to_primitive(role="public"), component_to_primitive),
+        ("relation", relations, lambda e: e.to_primitive(role="public"), relation_to_primitive),
+        ("health", health, lambda e: e.to_primitive(role="public"), health_to_primitive),
+        ("event", events, lambda e: e.to_primitive(role="public"), event_to_primitive),
+    ]
+
+
+def throughput(elements, serializer) -> float:
+    start = time.perf_counter()
+    for element in elements:
+        serializer(element)
+    return len(elements) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization throughput, schematics versus dedicated serializers")
+    parser.add_argument("--size", default=10000, type=int, help="Elements of each kind")
+    args = parser.parse_args()
+
+    print(f"{'element':>10} {'to_primitive/s':>16} {'serializer/s':>16} {'speedup':>8}")
+    for name, elements, schematics, serializer in build_elements(args.size):
+        slow = throughput(elements, schematics)
+        fast = throughput(elements, serializer)
+        print(f"{name:>10} {slow:>16,.0f} {fast:>16,.0f} {fast / slow:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import time
+import tracemalloc
+
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.model.factory import (StreamingTopologyFactory,
+                                            TopologyFactory, TopologySink)
+from static_topo_impl.model.serializers import (component_to_primitive,
+                                                health_to_primitive,
+                                                relation_to_primitive)
+from static_topo_impl.stackstate.encoder import encode_element
+
+TOPOLOGY = """
+components {
+  Host(name root)
+  Host(name ```"host-%d" % repeat_index```, repeat %REPEAT%, relations [root], data { index ```repeat_index``` })
+}
+"""
+
+
+# Encodes every element like a stream does, and then forgets it.
+class EncodingSink(TopologySink):
+    def add_component(self, component):
+        encode_element(component_to_primitive(component))
+
+    def add_relation(self, relation):
+        encode_element(relation_to_primitive(relation))
+
+    def add_health(self, health):
+        encode_element(health_to_primitive(health))
+
+
+def measure(factory: TopologyFactory, repeat: int):
+    interpreter = TopologyInterpreter(factory)
+    model = interpreter.topology_meta.model_from_str(TOPOLOGY.replace("%REPEAT%", str(repeat)))
+    tracemalloc.start()
+    start = time.perf_counter()
+    interpreter.interpret(model)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of repeated components, in memory versus streamed")
+    parser.add_argument("--repeats", default="1000,5000,20000", help="Comma separated repeat counts")
+    args = parser.parse_args()
+
+    # A stream still keeps the uid and name index and the relation ids, its memory per component shows what that costs.
+    print(f"{'repeat':>8} {'factory MB':>11} {'stream MB':>10} {'stream KB/c':>12} {'factory s':>10} {'stream s':>9}")
+    for repeat in [int(r) for r in args.repeats.split(",")]:
+        factory_peak, factory_time = measure(TopologyFactory(), repeat)
+        stream_peak, stream_time = measure(StreamingTopologyFactory(EncodingSink()), repeat)
+        per_component = stream_peak * 1024 / repeat
+        print(
+            f"{repeat:>8} {factory_peak:>11.1f} {stream_peak:>10.1f} {per_component:>12.2f} {factory_time:>10.2f}"
+            f" {stream_time:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
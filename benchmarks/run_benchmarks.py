@@ -0,0 +1,140 @@
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.dsl.parallel import resolve_partial_topology
+from static_topo_impl.model.factory import TopologyFactory
+from static_topo_impl.model.instance import StackStateSpec
+from static_topo_impl.model.stackstate_receiver import SyncStats
+from static_topo_impl.stackstate import StackStateClient
+from topology_generator import (TopologyShape, add_shape_arguments,
+                                generate_files, shape_from_arguments)
+
+# Measures parse, interpret, resolve and serialize throughput on generated topologies. Every stage runs `--rounds`
+# times and the fastest round is reported. Results are written as JSON and can be compared with an earlier run.
+
+
+def best_of(rounds: int, prepare: Callable[[], Any], run: Callable[[Any], Any]) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        state = prepare()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def interpret(paths: List[str]):
+    interpreter = TopologyInterpreter(TopologyFactory(), defer_resolution=True)
+    models = [interpreter.model_from_file(path) for path in paths]
+    for model in models:
+        interpreter.interpret(model)
+    return interpreter
+
+
+def run_benchmarks(shape: TopologyShape, rounds: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_files(shape, directory)
+        interpreter = interpret(paths)
+        models = [interpreter.model_from_file(path) for path in paths]
+        resolve_partial_topology(interpreter, interpreter.factory.events)
+        factory = interpreter.factory
+        counts = {
+            "files": len(paths),
+            "components": len(factory.components),
+            "relations": len(factory.relations),
+            "health": len(factory.health),
+            "events": len(factory.events),
+        }
+        elements = counts["components"] + counts["relations"] + counts["health"] + counts["events"]
+
+        def fresh_interpreter():
+            return TopologyInterpreter(TopologyFactory(), defer_resolution=True)
+
+        def interpreted():
+            result = fresh_interpreter()
+            for model in models:
+                result.interpret(model)
+            return result
+
+        spec = StackStateSpec(
+            {
+                "receiver_url": "http://127.0.0.1:7077",
+                "api_key": "benchmark",
+                "instance_type": "static_topo_dsl",
+                "instance_url": "benchmark",
+                "health_sync": {"stream_id": "benchmark"},
+            }
+        )
+        timings = {
+            "parse": best_of(rounds, fresh_interpreter, lambda i: [i.model_from_file(path) for path in paths]),
+            "interpret": best_of(rounds, fresh_interpreter, lambda i: [i.interpret(model) for model in models]),
+            "resolve": best_of(rounds, interpreted, lambda i: resolve_partial_topology(i, i.factory.events)),
+            "serialize": best_of(
+                rounds,
+                lambda: StackStateClient(spec),
+                lambda client: client.publish_all(
+                    list(factory.components.values()),
+                    list(factory.relations.values()),
+                    list(factory.health.values()),
+                    factory.events,
+                    dry_run=True,
+                    stats=SyncStats(),
+                ),
+            ),
+        }
+    throughput = {
+        # Parsing works on definitions, the repeat count only multiplies the later stages.
+        "parse": shape.files * shape.components / timings["parse"],
+        "interpret": counts["components"] / timings["interpret"],
+        "resolve": max(counts["relations"], 1) / timings["resolve"],
+        "serialize": elements / timings["serialize"],
+    }
+    return {
+        "created": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "shape": {k: getattr(shape, k) for k in ("files", "components", "repeat", "fan_out", "code_share", "events")},
+        "counts": counts,
+        "seconds": timings,
+        "elements_per_second": throughput,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse, interpret, resolve and serialize throughput")
+    add_shape_arguments(parser)
+    parser.add_argument("--rounds", default=3, type=int, help="Rounds per stage, the fastest one is reported")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = run_benchmarks(shape_from_arguments(args), args.rounds)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(", ".join(f"{k} {v}" for k, v in results["counts"].items()))
+    print(f"{'stage':>10} {'seconds':>10} {'elements/s':>14} {'vs baseline':>12}")
+    for stage, seconds in results["seconds"].items():
+        throughput = results["elements_per_second"][stage]
+        ratio = ""
+        if baseline is not None and stage in baseline["elements_per_second"]:
+            ratio = f"{throughput / baseline['elements_per_second'][stage]:.2f}x"
+        print(f"{stage:>10} {seconds:>10.4f} {throughput:>14,.0f} {ratio:>12}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
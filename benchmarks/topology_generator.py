@@ -0,0 +1,120 @@
+import argparse
+import os
+import random
+from typing import List
+
+import attr
+
+
+@attr.s(kw_only=True)
+class TopologyShape:
+    files: int = attr.ib(default=1)
+    components: int = attr.ib(default=100)  # Component definitions per file
+    repeat: int = attr.ib(default=1)  # Components generated by every definition
+    fan_out: int = attr.ib(default=2)  # Relations per component
+    code_share: float = attr.ib(default=0.25)  # Share of property values that are code blocks
+    events: int = attr.ib(default=1)  # Events per file
+    seed: int = attr.ib(default=42)
+
+    @property
+    def total_components(self) -> int:
+        return self.files * self.components * self.repeat
+
+
+def _value(rng: random.Random, shape: TopologyShape, text: str) -> str:
+    if rng.random() < shape.code_share:
+        return f'```"{text}".upper()```'
+    return f'"{text}"'
+
+
+def _component(rng: random.Random, shape: TopologyShape, file_index: int, index: int) -> str:
+    name = f"host_{file_index}_{index}"
+    properties = [f"layer {_value(rng, shape, 'machines')}", f"domain {_value(rng, shape, f'domain-{index % 10}')}"]
+    if shape.repeat > 1:
+        properties.insert(0, f'name ```"{name}_%d" % repeat_index```')
+        properties.append(f"repeat {shape.repeat}")
+    else:
+        properties.insert(0, f"name {name}")
+    # Relations point at earlier definitions, by name, so they resolve within the file.
+    targets = sorted(set(rng.randrange(index) for _ in range(shape.fan_out))) if index > 0 else []
+    if targets and shape.repeat == 1:
+        properties.append(f"relations [{', '.join(f'host_{file_index}_{t}' for t in targets)}]")
+    elif targets:
+        properties.append(f"relations [{', '.join(f'host_{file_index}_{t}_0' for t in targets)}]")
+    rack = _value(rng, shape, f"rack-{index % 42}")
+    properties.append(f"data {{ index {index}, rack {rack}, tags [a, b, {_value(rng, shape, 'c')}] }}")
+    return f"  Host({', '.join(properties)})"
+
+
+def _event(file_index: int, index: int, first_component: str) -> str:
+    return (
+        "  ElementPropertiesChanged(\n"
+        f'    title "Patched {file_index}-{index}"\n'
+        f'    message ```"{first_component} was patched"```\n'
+        f"    identifiers [ {first_component} ]\n"
+        '    tags ["benchmark"]\n'
+        '    previous { version "1" }\n'
+        '    current { version "2" }\n'
+        "  )"
+    )
+
+
+def generate_topology(shape: TopologyShape, file_index: int) -> str:
+    rng = random.Random(shape.seed * 7919 + file_index)
+    lines = ["defaults {", '  environment "Benchmark"', "  labels [ generated ]", "}", "", "components {"]
+    lines.extend(_component(rng, shape, file_index, index) for index in range(shape.components))
+    lines.append("}")
+    if shape.events > 0:
+        first_component = f"host_{file_index}_0" + ("_0" if shape.repeat > 1 else "")
+        lines.extend(["", "events {"])
+        lines.extend(_event(file_index, index, first_component) for index in range(shape.events))
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_files(shape: TopologyShape, directory: str) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for file_index in range(shape.files):
+        path = os.path.join(directory, f"generated-{file_index}.topo")
+        with open(path, "w") as f:
+            f.write(generate_topology(shape, file_index))
+        paths.append(path)
+    return paths
+
+
+def add_shape_arguments(parser: argparse.ArgumentParser):
+    defaults = TopologyShape()
+    parser.add_argument("--files", default=defaults.files, type=int, help="Number of .topo files")
+    parser.add_argument("--components", default=defaults.components, type=int, help="Component definitions per file")
+    parser.add_argument("--repeat", default=defaults.repeat, type=int, help="Repeat count of every definition")
+    parser.add_argument("--fan-out", default=defaults.fan_out, type=int, help="Relations per component")
+    parser.add_argument("--code-share", default=defaults.code_share, type=float, help="Share of code valued properties")
+    parser.add_argument("--events", default=defaults.events, type=int, help="Events per file")
+    parser.add_argument("--seed", default=defaults.seed, type=int, help="Random seed")
+
+
+def shape_from_arguments(args: argparse.Namespace) -> TopologyShape:
+    return TopologyShape(
+        files=args.files,
+        components=args.components,
+        repeat=args.repeat,
+        fan_out=args.fan_out,
+        code_share=args.code_share,
+        events=args.events,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic .topo files")
+    parser.add_argument("directory", help="Directory to write the files to")
+    add_shape_arguments(parser)
+    args = parser.parse_args()
+    shape = shape_from_arguments(args)
+    for path in generate_files(shape, args.directory):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
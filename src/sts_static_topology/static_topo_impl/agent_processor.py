@@ -1,46 +1,130 @@
-import os
-from typing import List
+from typing import Any, Callable, Dict, List, Tuple
 
 from stackstate_checks.base import AgentCheck, Health
 from static_topo_impl.dsl.interpreter import TopologyInterpreter
-from static_topo_impl.model.factory import TopologyFactory
+from static_topo_impl.dsl.topology_cache import (TopologyCache,
+                                                 list_topology_files)
+from static_topo_impl.model.elements import (Component, Event,
+                                             HealthCheckState, Relation)
+from static_topo_impl.model.factory import (StreamingTopologyFactory,
+                                             TopologyFactory, TopologySink)
 from static_topo_impl.model.instance import InstanceInfo
-from static_topo_impl.model.stackstate import (Component, HealthCheckState,
-                                               Relation)
+from static_topo_impl.model.serializers import (event_to_primitive,
+                                                properties_to_primitive)
+from static_topo_impl.profiling import DISABLED, Profiler
+
+# Elements serialized and submitted to the agent check at a time.
+AGENT_BATCH_ELEMENTS = 1000
+
+
+def component_arguments(component: Component) -> Tuple[str, str, Dict[str, Any]]:
+    component.properties.dedup_labels()
+    return component.uid, component.get_type(), properties_to_primitive(component.properties)
+
+
+def relation_arguments(relation: Relation) -> Tuple[str, str, str, Dict[str, Any]]:
+    return relation.source_id, relation.target_id, relation.get_type(), relation.properties
+
+
+def check_state_arguments(health: HealthCheckState) -> Tuple[str, str, Health, str, str]:
+    health_value = health.health
+    if not isinstance(health_value, Health):
+        health_value = Health[health_value]
+    return health.check_id, health.check_name, health_value, health.topo_identifier, health.message
+
+
+def event_arguments(event: Event) -> Tuple[Dict[str, Any]]:
+    return (event_to_primitive(event),)
+
+
+# Components and relations go to the agent as they are interpreted. Health states are kept by check id until all files
+# are done, so a later state of a check replaces the earlier one like in TopologyFactory.health.
+class AgentTopologySink(TopologySink):
+    def __init__(self, agent_check: AgentCheck):
+        self.agent_check = agent_check
+        self.components = 0
+        self.relations = 0
+        self.health: Dict[str, HealthCheckState] = {}
+
+    def add_component(self, component: Component):
+        self.agent_check.component(*component_arguments(component))
+        self.components += 1
+
+    def add_relation(self, relation: Relation):
+        self.agent_check.relation(*relation_arguments(relation))
+        self.relations += 1
+
+    def add_health(self, health: HealthCheckState):
+        self.health[health.check_id] = health
 
 
 class AgentProcessor:
-    def __init__(self, instance: InstanceInfo, agent_check: AgentCheck):
+    def __init__(self, instance: InstanceInfo, agent_check: AgentCheck, topology_cache: TopologyCache = None):
         self.agent_check = agent_check
         self.log = agent_check.log
         self.instance = instance
         self.factory = TopologyFactory()
+        self.topology_cache = topology_cache or TopologyCache()
+        self.profiler = Profiler() if instance.profile else DISABLED
 
     def process(self):
-        interpreter = TopologyInterpreter(self.factory)
-        for topo_dsl_file in self.instance.topo_files:
-            if topo_dsl_file.endswith(".topo"):
-                topo_files = [topo_dsl_file]  # Single file
-            else:
-                topo_files = [os.path.join(topo_dsl_file, f) for f in os.listdir(topo_dsl_file) if f.endswith(".topo")]
+        with self.profiler.stage("discovery"):
+            topo_files = list_topology_files(self.instance.topo_files)
+        if self.instance.streaming:
+            self._process_streaming(topo_files)
+        else:
+            interpreter = TopologyInterpreter(
+                self.factory, profiler=self.profiler, event_workers=self.instance.event_workers
+            )
+            self.topology_cache.interpret(interpreter, topo_files, self.log, self.instance.parallel_workers)
+            with self.profiler.stage("publish"):
+                self._publish()
+        if self.profiler.enabled:
+            self._send_profile()
+
+    def _send_profile(self):
+        for name, timing in self.profiler.stages.items():
+            tags = [f"stage:{name}"]
+            self.agent_check.gauge("static_topology.stage.seconds", timing.seconds, tags=tags)
+            self.agent_check.gauge("static_topology.stage.count", timing.count, tags=tags)
+        for snippet in self.profiler.slowest_snippets():
+            self.log.info(f"Code block at {snippet.location} took {snippet.seconds:.3f}s in {snippet.calls} calls")
+
+    # Components and relations go to the agent as they are interpreted, the topology snapshot stays open until all files
+    # are done. The health snapshot follows it.
+    def _process_streaming(self, topo_files: List[str]):
+        sink = AgentTopologySink(self.agent_check)
+        self.factory = StreamingTopologyFactory(sink)
+        interpreter = TopologyInterpreter(
+            self.factory, profiler=self.profiler, event_workers=self.instance.event_workers
+        )
+        self.agent_check.start_snapshot()
+        try:
             for topo_file in topo_files:
-                self.log.info(f"Processing '{topo_file}'")
-                model = interpreter.model_from_file(topo_file)
-                interpreter.interpret(model)
-        self._publish()
+                interpreter.interpret(interpreter.model_from_file(topo_file))
+        except Exception:
+            # A stop would make the agent remove every component that was not sent yet.
+            self.log.error(
+                f"Streaming failed after '{sink.components}' components were sent, the partial topology snapshot is "
+                "left open without a stop."
+            )
+            raise
+        self.agent_check.stop_snapshot()
+        self.log.info(f"Streamed '{sink.components}' components, '{sink.relations}' relations")
+        self.log.info(f"Synchronizing  '{len(sink.health)}' health states")
+        self.agent_check.health.start_snapshot()
+        self._emit(list(sink.health.values()), check_state_arguments, self.agent_check.health.check_state)
+        self.agent_check.health.stop_snapshot()
+        self._publish_events()
 
     def _publish(self):
-        self.log.info(f"Publishing '{len(self.factory.components.values())}' components")
+        components: List[Component] = list(self.factory.components.values())
+        self.log.info(f"Publishing '{len(components)}' components")
         self.agent_check.start_snapshot()
-        components: List[Component] = self.factory.components.values()
-        for c in components:
-            c.properties.dedup_labels()
-            c_as_dict = c.properties.to_primitive()
-            self.agent_check.component(c.uid, c.get_type(), c_as_dict)
-        self.log.info(f"Publishing '{len(self.factory.relations)}' relations")
-        relations: List[Relation] = self.factory.relations.values()
-        for r in relations:
-            self.agent_check.relation(r.source_id, r.target_id, r.get_type(), r.properties)
+        self._emit(components, component_arguments, self.agent_check.component)
+        relations: List[Relation] = list(self.factory.relations.values())
+        self.log.info(f"Publishing '{len(relations)}' relations")
+        self._emit(relations, relation_arguments, self.agent_check.relation)
         self.agent_check.stop_snapshot()
         self._publish_health()
         self._publish_events()
@@ -48,30 +132,25 @@ class AgentProcessor:
     def _publish_health(self):
         self.log.info(f"Synchronizing  '{len(self.factory.health)}' health states")
         self.agent_check.health.start_snapshot()
-        deviating, clear, critical = 0, 0, 0
-        health_instances: List[HealthCheckState] = self.factory.health.values()
-        for health in health_instances:
-            health_value = health.health
-            if not isinstance(health_value, Health):
-                health_value = Health[health_value]
-            if health_value == Health.CLEAR:
-                clear += 1
-            elif health_value == Health.CRITICAL:
-                critical += 1
-            elif health_value == Health.DEVIATING:
-                deviating += 1
-            self.agent_check.health.check_state(
-                health.check_id,
-                health.check_name,
-                health_value,
-                health.topo_identifier,
-                health.message,
-            )
-        self.log.info(f"Critical -> {critical}, Deviating -> {deviating}, Clear -> {clear}")
+        health_instances: List[HealthCheckState] = list(self.factory.health.values())
+        self._emit(health_instances, check_state_arguments, self.agent_check.health.check_state)
+        counts = self.factory.health.counts()
+        self.log.info(
+            f"Critical -> {counts['CRITICAL']}, Deviating -> {counts['DEVIATING']}, Clear -> {counts['CLEAR']}"
+        )
         self.agent_check.health.stop_snapshot()
 
     def _publish_events(self):
         self.log.info(f"Sending  '{len(self.factory.events)}' events")
-        for event in self.factory.events:
-            event_dict = event.to_primitive(role="public")
-            self.agent_check.event(event_dict)
+        self._emit(self.factory.events, event_arguments, self.agent_check.event)
+
+    # The agent check API takes one element per call. A batch is serialized in one go first, so the serialization and
+    # emission stages show where a check run spends its time, then submitted without converting anything in between.
+    def _emit(self, elements: List[Any], arguments: Callable[[Any], Tuple], submit: Callable):
+        for start in range(0, len(elements), AGENT_BATCH_ELEMENTS):
+            batch = elements[start : start + AGENT_BATCH_ELEMENTS]
+            with self.profiler.stage("serialization", count=len(batch)):
+                serialized = [arguments(element) for element in batch]
+            with self.profiler.stage("emission", count=len(batch)):
+                for element_arguments in serialized:
+                    submit(*element_arguments)
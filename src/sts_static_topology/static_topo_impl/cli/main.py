@@ -2,15 +2,32 @@ import json
 import logging
 import os
 import time
+from typing import Optional
 
 import click
 import yaml
 from schematics.exceptions import DataError
+from static_topo_impl.cli.watcher import FileWatcher
 from static_topo_impl.cli_processor import CliProcessor
+from static_topo_impl.dsl.topology_cache import TopologyCache
 from static_topo_impl.model.instance import Configuration
+from static_topo_impl.model.stackstate_receiver import ProfileStats
+from static_topo_impl.profiling import DISABLED, Profiler
+from static_topo_impl.stackstate.sync_state import TopologySyncState
 
 
-def run(conf: str, log_level: str, dry_run: bool, repeat: bool, work_dir: str, repeat_interval: int):
+def run(
+    conf: str,
+    log_level: str,
+    dry_run: bool,
+    repeat: bool,
+    work_dir: str,
+    repeat_interval: int,
+    profile: bool = False,
+    watch: bool = False,
+    debounce: float = 1.0,
+    keep_alive_interval: int = 600,
+):
     logging.basicConfig(
         level=log_level.upper(),
         format="%(asctime)s - %(name)s (%(lineno)s) - %(levelname)s: %(message)s",
@@ -21,18 +38,70 @@ def run(conf: str, log_level: str, dry_run: bool, repeat: bool, work_dir: str, r
         os.chdir(work_dir)
         click.echo("Current working directory: {0}".format(os.getcwd()))
 
-    if repeat:
+    topology_cache = TopologyCache()
+    sync_state = TopologySyncState()
+    if watch:
+        _watch(conf, dry_run, topology_cache, sync_state, profile, debounce, keep_alive_interval)
+    elif repeat:
         click.echo("Running in repeat mode.")
         while True:
-            _internal_run(conf, dry_run)
+            _internal_run(conf, dry_run, topology_cache, sync_state, profile)
             click.echo(f"Will repeat after {repeat_interval} seconds.")
             time.sleep(repeat_interval)
             click.echo("Repeating...")
     else:
-        _internal_run(conf, dry_run)
+        _internal_run(conf, dry_run, topology_cache, sync_state, profile)
 
 
-def _internal_run(conf: str, dry_run: bool):
+# Syncs once and then again whenever the configuration or a topology file changes, or when nothing changed for
+# keep_alive_interval seconds so StackState does not expire the topology. A broken configuration or topology file is
+# logged and the sync is retried on the next change.
+def _watch(
+    conf: str,
+    dry_run: bool,
+    topology_cache: TopologyCache,
+    sync_state: TopologySyncState,
+    profile: bool,
+    debounce: float,
+    keep_alive_interval: int,
+):
+    watcher = FileWatcher(debounce)
+    click.echo(
+        f"Running in watch mode ({'inotify' if watcher.uses_inotify else 'polling'}), "
+        f"keep-alive sync every {keep_alive_interval} seconds."
+    )
+    try:
+        while True:
+            configuration = None
+            try:
+                configuration = _load_configuration(conf)
+            except Exception as e:
+                logging.exception(f"Failed to load configuration: {e}")
+            # Watch what this sync reads, edits made while it runs then trigger the next one.
+            watcher.watch(conf, configuration.topo_files if configuration is not None else [])
+            if configuration is not None:
+                try:
+                    _sync(configuration, dry_run, topology_cache, sync_state, profile)
+                except Exception as e:
+                    logging.exception(f"Static Topology sync failed: {e}")
+            if watcher.wait(keep_alive_interval):
+                click.echo("Changes detected, syncing...")
+            else:
+                click.echo("Keep-alive sync...")
+    finally:
+        watcher.close()
+
+
+def _internal_run(
+    conf: str, dry_run: bool, topology_cache: TopologyCache, sync_state: TopologySyncState, profile: bool = False
+):
+    configuration = _load_configuration(conf)
+    if configuration is None:
+        return 1
+    _sync(configuration, dry_run, topology_cache, sync_state, profile)
+
+
+def _load_configuration(conf: str) -> Optional[Configuration]:
     click.echo(f"Loading configuration from {conf}")
     with open(conf) as f:
         dict_config = yaml.safe_load(f)
@@ -42,11 +111,21 @@ def _internal_run(conf: str, dry_run: bool):
     except DataError as e:
         click.echo("Failed to load configuration:", err=True)
         click.echo(json.dumps(e.to_primitive(), indent=4), err=True)
-        return 1
+        return None
+    return configuration
 
+
+def _sync(
+    configuration: Configuration,
+    dry_run: bool,
+    topology_cache: TopologyCache,
+    sync_state: TopologySyncState,
+    profile: bool,
+):
+    profiler = Profiler() if profile else DISABLED
     if dry_run:
         click.echo("Running Static Topology sync in dry-run mode")
-        result = CliProcessor(configuration).run(dry_run)
+        result = CliProcessor(configuration, topology_cache, sync_state, profiler).run(dry_run)
         click.echo("Discovered Component and Relation information:")
         click.echo("-" * 80)
         for payload in result.payloads:
@@ -54,17 +133,40 @@ def _internal_run(conf: str, dry_run: bool):
             click.echo("-" * 80)
     else:
         click.echo("Running Static Topology sync")
-        result = CliProcessor(configuration).run()
+        result = CliProcessor(configuration, topology_cache, sync_state, profiler).run()
 
     click.echo("-" * 80)
     click.echo(f"Total Components = {result.components}.")
     click.echo(f"Total Relations = {result.relations}.")
+    if configuration.stackstate.delta_sync:
+        click.echo(
+            f"Delta = {result.changed_components} components, {result.changed_relations} relations, "
+            f"{result.deleted} deletes."
+        )
     click.echo(f"Total Events = {result.events}.")
     click.echo(f"Total Health Syncs = {result.checks}.")
+    if configuration.stackstate.skip_unchanged:
+        click.echo(f"Channels = {result.channels_sent} sent, {result.channels_skipped} skipped as unchanged.")
+    if not dry_run:
+        click.echo(f"Total Intake Requests = {result.requests} ({result.retries} retries).")
+    if result.profile is not None:
+        _echo_profile(result.profile)
     click.echo("-" * 80)
     click.echo("Done")
 
 
+def _echo_profile(profile: ProfileStats):
+    click.echo("-" * 80)
+    click.echo(f"{'Stage':<16} {'Time ms':>12} {'Count':>8}")
+    for stage in profile.stages:
+        click.echo(f"{stage.name:<16} {stage.seconds * 1000:>12.3f} {stage.count:>8}")
+    if profile.slowest_snippets:
+        click.echo("Slowest code blocks:")
+        for snippet in profile.slowest_snippets:
+            first_line = snippet.expression.split("\n")[0]
+            click.echo(f"{snippet.seconds * 1000:>12.3f}ms {snippet.calls:>6} calls  {snippet.location}  {first_line}")
+
+
 @click.command()
 @click.option("-f", "--conf", default="./conf.yaml", help="Configuration yaml file")
 @click.option("--log-level", default="info", help="Log Level")
@@ -72,8 +174,27 @@ def _internal_run(conf: str, dry_run: bool):
 @click.option("--repeat", is_flag=True, help="Runs topology sync as specified by the --repeat-interval")
 @click.option("--work-dir", default=".", help="Set the current working directory")
 @click.option("--repeat-interval", default="30", type=int, help="Repeat interval in seconds. Default 30.")
-def cli(conf: str, log_level: str, dry_run: bool, repeat: bool, work_dir: str, repeat_interval: int):
-    return run(conf, log_level, dry_run, repeat, work_dir, repeat_interval)
+@click.option("--profile", is_flag=True, help="Report time spent per stage and the slowest code blocks")
+@click.option("--watch", is_flag=True, help="Runs topology sync whenever the configuration or a topology file changes")
+@click.option("--debounce", default=1.0, type=float, help="Seconds without changes before a watch sync. Default 1.")
+@click.option(
+    "--keep-alive-interval", default=600, type=int, help="Seconds between watch syncs without changes. Default 600."
+)
+def cli(
+    conf: str,
+    log_level: str,
+    dry_run: bool,
+    repeat: bool,
+    work_dir: str,
+    repeat_interval: int,
+    profile: bool,
+    watch: bool,
+    debounce: float,
+    keep_alive_interval: int,
+):
+    return run(
+        conf, log_level, dry_run, repeat, work_dir, repeat_interval, profile, watch, debounce, keep_alive_interval
+    )
 
 
 def main():
@@ -0,0 +1,135 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import time
+from typing import Dict, List, Set, Tuple
+
+# inotify(7) events that can change a watched file: writes, attribute changes and files created, removed or renamed.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+FileSignature = Tuple[int, int, int]
+
+
+def _open_inotify():
+    if not sys.platform.startswith("linux"):
+        return None, -1
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, -1
+    if fd < 0:
+        return None, -1
+    return libc, fd
+
+
+# Waits for the configuration file or topology files to change. Watched directories are monitored with inotify where
+# available, otherwise they are polled every poll_interval seconds. Either way a change is confirmed by comparing the
+# size, modification time and inode of the watched files, so events for unrelated files never trigger a sync. A burst
+# of edits is reported once the files have been left alone for debounce seconds.
+class FileWatcher:
+    def __init__(self, debounce: float = 1.0, poll_interval: float = 1.0, use_inotify: bool = True):
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.libc, self.fd = _open_inotify() if use_inotify else (None, -1)
+        self.directories: Set[str] = set()
+        # Set when a directory could not be watched (yet), inotify then wakes up to poll as well.
+        self.unwatched = False
+        self.conf = ""
+        self.topo_files: List[str] = []
+        self.snapshot: Dict[str, FileSignature] = {}
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self.fd >= 0
+
+    def watch(self, conf: str, topo_files: List[str]):
+        self.conf = conf
+        self.topo_files = topo_files
+        directories = {os.path.dirname(os.path.abspath(conf))}
+        for topo_file in topo_files:
+            path = os.path.abspath(topo_file)
+            directories.add(os.path.dirname(path) if topo_file.endswith(".topo") else path)
+        if self.uses_inotify and (directories != self.directories or self.unwatched):
+            self._rewatch(directories)
+        self.directories = directories
+        self.snapshot = self._take_snapshot()
+
+    def wait(self, timeout: float) -> bool:
+        # True when the watched files changed, False when the timeout passed without changes.
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._sleep(remaining)
+            current = self._take_snapshot()
+            if current != self.snapshot:
+                break
+        while True:
+            self._sleep(self.debounce, wake_on_event=False)
+            settled = self._take_snapshot()
+            if settled == current:
+                return True
+            current = settled
+
+    def close(self):
+        if self.uses_inotify:
+            os.close(self.fd)
+            self.fd = -1
+
+    def _sleep(self, seconds: float, wake_on_event: bool = True):
+        if not self.uses_inotify:
+            time.sleep(min(seconds, self.poll_interval) if wake_on_event else seconds)
+            return
+        if wake_on_event:
+            select.select([self.fd], [], [], min(seconds, self.poll_interval) if self.unwatched else seconds)
+        else:
+            time.sleep(seconds)
+        self._drain()
+
+    def _drain(self):
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _rewatch(self, directories: Set[str]):
+        # Watch descriptors are dropped with the old inotify instance.
+        os.close(self.fd)
+        self.libc, self.fd = _open_inotify()
+        if not self.uses_inotify:
+            logging.warning("Failed to reopen inotify, falling back to polling")
+            return
+        self.unwatched = False
+        for directory in sorted(directories):
+            if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+                logging.debug(f"Failed to watch '{directory}': {os.strerror(ctypes.get_errno())}")
+                self.unwatched = True
+
+    def _take_snapshot(self) -> Dict[str, FileSignature]:
+        snapshot: Dict[str, FileSignature] = {}
+        paths = [self.conf]
+        for topo_file in self.topo_files:
+            if topo_file.endswith(".topo"):
+                paths.append(topo_file)
+            elif os.path.isdir(topo_file):
+                paths.extend(os.path.join(topo_file, f) for f in os.listdir(topo_file) if f.endswith(".topo"))
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        return snapshot
@@ -1,33 +1,78 @@
 import logging
-import os
+from typing import List
 
 from static_topo_impl.dsl.interpreter import TopologyInterpreter
-from static_topo_impl.model.factory import TopologyFactory
+from static_topo_impl.dsl.model_cache import ModelCache
+from static_topo_impl.dsl.topology_cache import (TopologyCache,
+                                                 list_topology_files)
+from static_topo_impl.model.factory import (StreamingTopologyFactory,
+                                             TopologyFactory)
 from static_topo_impl.model.instance import Configuration
 from static_topo_impl.model.stackstate_receiver import SyncStats
+from static_topo_impl.profiling import DISABLED, Profiler
 from static_topo_impl.stackstate import StackStateClient
+from static_topo_impl.stackstate.sync_state import TopologySyncState
 
 
 class CliProcessor:
-    def __init__(self, config: Configuration):
+    def __init__(
+        self,
+        config: Configuration,
+        topology_cache: TopologyCache = None,
+        sync_state: TopologySyncState = None,
+        profiler: Profiler = DISABLED,
+    ):
         self.config = config
-        self.stackstate: StackStateClient = StackStateClient(config.stackstate)
+        self.profiler = profiler
+        self.stackstate: StackStateClient = StackStateClient(config.stackstate, sync_state, profiler)
         self.factory: TopologyFactory = TopologyFactory()
+        self.topology_cache = topology_cache or TopologyCache()
+        self.model_cache = None
+        if config.model_cache_dir:
+            self.model_cache = ModelCache(config.model_cache_dir, config.model_cache_max_bytes)
 
+    # A processor runs once, its connections to the receiver are closed when it is done.
     def run(self, dry_run=False) -> SyncStats:
-        interpreter = TopologyInterpreter(self.factory)
-        for topo_dsl_file in self.config.topo_files:
-            if topo_dsl_file.endswith(".topo"):
-                topo_files = [topo_dsl_file]  # Single file
+        with self.stackstate:
+            with self.profiler.stage("discovery"):
+                topo_files = list_topology_files(self.config.topo_files)
+            if self.config.streaming:
+                stats = self._run_streaming(topo_files, dry_run)
             else:
-                topo_files = [os.path.join(topo_dsl_file, f) for f in os.listdir(topo_dsl_file) if f.endswith(".topo")]
-            for topo_file in topo_files:
-                logging.info(f"Processing '{topo_file}'")
-                model = interpreter.model_from_file(topo_file)
-                interpreter.interpret(model)
+                interpreter = self._interpreter()
+                self.topology_cache.interpret(
+                    interpreter, topo_files, logging.getLogger(), self.config.parallel_workers
+                )
+                stats = self.stackstate.publish_all(
+                    list(self.factory.components.values()),
+                    list(self.factory.relations.values()),
+                    list(self.factory.health.values()),
+                    self.factory.events,
+                    dry_run,
+                    SyncStats(),
+                )
+        if self.profiler.enabled:
+            stats.profile = self.profiler.to_stats()
+        return stats
 
-        stats = self.stackstate.publish(
-            list(self.factory.components.values()), list(self.factory.relations.values()), dry_run
+    def _interpreter(self) -> TopologyInterpreter:
+        return TopologyInterpreter(
+            self.factory,
+            profiler=self.profiler,
+            model_cache=self.model_cache,
+            event_workers=self.config.event_workers,
         )
-        self.stackstate.publish_health_checks(list(self.factory.health.values()), dry_run=dry_run, stats=stats)
+
+    # Files are parsed and interpreted every run, the topology cache would hold on to everything the stream lets go of.
+    def _run_streaming(self, topo_files: List[str], dry_run: bool) -> SyncStats:
+        stream = self.stackstate.stream(dry_run, SyncStats())
+        self.factory = StreamingTopologyFactory(stream)
+        interpreter = self._interpreter()
+        try:
+            for topo_file in topo_files:
+                interpreter.interpret(interpreter.model_from_file(topo_file))
+        except Exception:
+            stream.abort()
+            raise
+        stats = stream.close()
         return self.stackstate.publish_events(self.factory.events, dry_run=dry_run, stats=stats)
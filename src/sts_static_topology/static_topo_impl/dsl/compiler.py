@@ -0,0 +1,89 @@
+import ast
+from typing import Any, Optional, Tuple
+
+import attr
+from textx import get_children_of_type
+
+
+@attr.s(kw_only=True)
+class CompiledCode:
+    expression: str = attr.ib()
+    tree: Optional[ast.Module] = attr.ib(default=None)
+
+
+def normalize_code(code: str) -> str:
+    code = code.strip()
+    if code.endswith("```"):
+        code = code[:-3]
+    code_lines = code.split("\n")
+    # Fix first line indentation
+    if len(code_lines) > 1:
+        padding_count = 0
+        second_line = code_lines[1]
+        for i in range(0, len(second_line)):
+            if second_line[i] != " ":
+                break
+            padding_count += 1
+        for i in range(1, len(code_lines)):
+            code_lines[i] = code_lines[i][padding_count:]
+    return "\n".join(code_lines)
+
+
+def compile_code(code: str) -> CompiledCode:
+    expression = normalize_code(code)
+    try:
+        tree = ast.parse(expression)
+    except Exception:
+        # Leave it to asteval to report the syntax error when the code block is evaluated.
+        tree = None
+    return CompiledCode(expression=expression, tree=tree)
+
+
+def get_compiled_code(code_ast: Any) -> CompiledCode:
+    compiled = getattr(code_ast, "compiled", None)
+    if compiled is None:
+        compiled = code_ast.compiled = compile_code(code_ast.code)
+    return compiled
+
+
+def copy_constant(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: copy_constant(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [copy_constant(v) for v in value]
+    return value
+
+
+def _fold_constant(value_ast: Any) -> Tuple[bool, Any]:
+    rule = value_ast.__class__.__name__
+    if rule == "PropertyCode":
+        return False, None
+    elif rule == "PropertyObject":
+        if not hasattr(value_ast, "constant"):
+            value = {}
+            value_ast.constant = True
+            for member in value_ast.members:
+                constant, value[member.key] = _fold_constant(member.value)
+                value_ast.constant = value_ast.constant and constant
+            value_ast.constant_value = value if value_ast.constant else None
+        return value_ast.constant, value_ast.constant_value
+    elif rule == "PropertyList":
+        if not hasattr(value_ast, "constant"):
+            value_list = []
+            value_ast.constant = True
+            for v in value_ast.values:
+                constant, item = _fold_constant(v)
+                value_list.append(item)
+                value_ast.constant = value_ast.constant and constant
+            value_ast.constant_value = value_list if value_ast.constant else None
+        return value_ast.constant, value_ast.constant_value
+    return True, value_ast
+
+
+def compile_model(model: Any) -> Any:
+    for code_ast in get_children_of_type("PropertyCode", model):
+        code_ast.compiled = compile_code(code_ast.code)
+    # Objects and lists without code are converted once here, the interpreter hands out copies of them.
+    for value_ast in get_children_of_type("PropertyObject", model) + get_children_of_type("PropertyList", model):
+        _fold_constant(value_ast)
+    return model
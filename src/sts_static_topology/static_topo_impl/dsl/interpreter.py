@@ -1,14 +1,22 @@
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import attr
 from asteval import Interpreter
 from six import string_types
+from static_topo_impl.dsl.compiler import (CompiledCode, compile_model,
+                                           copy_constant, get_compiled_code)
+from static_topo_impl.dsl.model_cache import ModelCache
+from static_topo_impl.dsl.resolver import RelationResolver
+from static_topo_impl.model.elements import (Component, Event,
+                                             HealthCheckState, Relation,
+                                             SourceLink)
 from static_topo_impl.model.factory import TopologyFactory
-from static_topo_impl.model.stackstate import (Component, Event,
-                                               HealthCheckState, Relation,
-                                               SourceLink)
+from static_topo_impl.profiling import DISABLED, Profiler
 from textx import metamodel_from_str, textx_isinstance
 from textx.metamodel import TextXMetaModel
 from textx.model import TextXSyntaxError
@@ -22,6 +30,41 @@ class TopologyContext:
     event: Event = attr.ib(default=None)
 
 
+class CodeEvaluator:
+    # Building an asteval Interpreter rebuilds its whole symbol table, so one is kept alive and its symbol table is
+    # restored to the builtins before every evaluation. User variables and errors never leak between code blocks.
+    def __init__(self, profiler: Profiler = DISABLED):
+        self.aeval = Interpreter()
+        self.builtins = dict(self.aeval.symtable)
+        self.profiler = profiler
+
+    def bind(self, ctx: TopologyContext) -> Interpreter:
+        aeval = self.aeval
+        symtable = aeval.symtable
+        symtable.clear()
+        symtable.update(self.builtins)
+        symtable["factory"] = ctx.factory
+        symtable["component"] = ctx.component
+        symtable["event"] = ctx.event
+        symtable["repeat_index"] = ctx.repeat_index
+        aeval.error = []
+        aeval.error_msg = None
+        aeval.retval = None
+        aeval._interrupt = None
+        return aeval
+
+    @staticmethod
+    def run(aeval: Interpreter, compiled: CompiledCode) -> Any:
+        if compiled.tree is None:
+            return aeval.eval(compiled.expression)
+        aeval.start_time = time.time()
+        try:
+            return aeval.run(compiled.tree, expr=compiled.expression, lineno=0)
+        except Exception:
+            # asteval records the failure in aeval.error, which the caller reports.
+            return None
+
+
 class PropertyInterpreter:
     def __init__(
         self,
@@ -30,12 +73,14 @@ class PropertyInterpreter:
         source_name: str,
         ctx: TopologyContext,
         topology_meta: TextXMetaModel,
+        evaluator: Optional[CodeEvaluator] = None,
     ):
         self.source_name = source_name
         self.defaults = defaults
         self.properties = properties
         self.ctx = ctx
         self.topology_meta = topology_meta
+        self.evaluator = evaluator or CodeEvaluator()
         self.PropertyObjectClass = self.topology_meta["PropertyObject"]
         self.PropertyListClass = self.topology_meta["PropertyList"]
         self.PropertyCodeClass = self.topology_meta["PropertyCode"]
@@ -93,9 +138,9 @@ class PropertyInterpreter:
     def run_processors(self, defaults_name="processor"):
         name = "processor"
         if self._is_code(name, self.properties):
-            self._run_code(self.properties[name].code, name, self.source_name)
+            self._run_code(self.properties[name], name, self.source_name)
         if self._is_code(name, self.defaults):
-            self._run_code(self.defaults[defaults_name].code, defaults_name, self.default_source)
+            self._run_code(self.defaults[defaults_name], defaults_name, self.default_source)
 
     def get_property_value(self, name: str, properties: Dict[str, Any], source_name: str, default: Any = None) -> Any:
         value_ast = properties.get(name, default)
@@ -108,6 +153,8 @@ class PropertyInterpreter:
     def _convert_value(self, value_ast: Any, property_name: str, source_name: str) -> Any:
         if value_ast is None:
             return None
+        elif getattr(value_ast, "constant", False):
+            return copy_constant(value_ast.constant_value)
         elif textx_isinstance(value_ast, self.PropertyObjectClass):
             value = {}
             for member in value_ast.members:
@@ -119,7 +166,7 @@ class PropertyInterpreter:
                 value_list.append(self._convert_value(v, property_name, source_name))
             return value_list
         elif textx_isinstance(value_ast, self.PropertyCodeClass):
-            return self._run_code(value_ast.code, property_name, source_name)
+            return self._run_code(value_ast, property_name, source_name)
         else:
             return value_ast
 
@@ -155,96 +202,156 @@ class PropertyInterpreter:
                 raise Exception(f"Expected list type for '{name}', but was {type(value)} on `{source_name}`")
         return value
 
-    def _run_code(self, code: str, property_name, source_name: str) -> Any:
-        aeval = self._get_asteval_interpreter(self.ctx)
-        code = code.strip()
-        if code.endswith("```"):
-            code = code[:-3]
-        code_lines = code.split("\n")
-        # Fix first line indentation
-        if len(code_lines) > 1:
-            padding_count = 0
-            second_line = code_lines[1]
-            for i in range(0, len(second_line)):
-                if second_line[i] != " ":
-                    break
-                padding_count += 1
-            for i in range(1, len(code_lines)):
-                code_lines[i] = code_lines[i][padding_count:]
-        code = "\n".join(code_lines)
-        value = self._eval_expression(code, aeval, property_name, source_name)
-        return value
-
-    @staticmethod
-    def _get_asteval_interpreter(ctx: TopologyContext) -> Interpreter:
-        aeval = Interpreter()
-        aeval.symtable["factory"] = ctx.factory
-        aeval.symtable["component"] = ctx.component
-        aeval.symtable["event"] = ctx.event
-        aeval.symtable["repeat_index"] = ctx.repeat_index
-        return aeval
+    def _run_code(self, code_ast: Any, property_name, source_name: str) -> Any:
+        compiled = get_compiled_code(code_ast)
+        aeval = self.evaluator.bind(self.ctx)
+        profiler = self.evaluator.profiler
+        if not profiler.enabled:
+            return self._eval_expression(compiled, aeval, property_name, source_name)
+        start = time.perf_counter()
+        try:
+            return self._eval_expression(compiled, aeval, property_name, source_name)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.record("code", elapsed)
+            profiler.record_snippet(code_ast, compiled.expression, elapsed)
 
     @staticmethod
     def _eval_expression(
-        expression: str, aeval: Interpreter, eval_property: str, source_name: str, fail_on_error: bool = True
+        compiled: CompiledCode, aeval: Interpreter, eval_property: str, source_name: str, fail_on_error: bool = True
     ):
         existing_errs = len(aeval.error)
-        result = aeval.eval(expression)
+        result = CodeEvaluator.run(aeval, compiled)
         if len(aeval.error) > existing_errs and fail_on_error:
             error_messages = []
             for err in aeval.error:
                 error_messages.append(err.get_error())
             raise Exception(
                 f"Failed to evaluate property '{eval_property}' on `{source_name}`. "
-                f"Expression |\n {expression} \n |.\n Errors:\n {error_messages}"
+                f"Expression |\n {compiled.expression} \n |.\n Errors:\n {error_messages}"
             )
         return result
 
 
+_topology_meta: Optional[TextXMetaModel] = None
+_topology_meta_lock = threading.Lock()
+
+
+def get_topology_metamodel() -> TextXMetaModel:
+    # The metamodel is immutable once built and textX clones its parser per model, so one instance is shared by
+    # every interpreter in the process.
+    global _topology_meta
+    if _topology_meta is None:
+        with _topology_meta_lock:
+            if _topology_meta is None:
+                _topology_meta = metamodel_from_str(TOPOLOGY_TX)
+    return _topology_meta
+
+
 class TopologyInterpreter:
-    def __init__(self, factory: TopologyFactory):
+    def __init__(
+        self,
+        factory: TopologyFactory,
+        defer_resolution: bool = False,
+        profiler: Profiler = DISABLED,
+        model_cache: Optional[ModelCache] = None,
+        event_workers: int = 0,
+    ):
         self.factory = factory
-        self.topology_meta = metamodel_from_str(TOPOLOGY_TX)
+        # When deferred, relations and event identifiers are resolved by the caller once all files are merged.
+        self.defer_resolution = defer_resolution
+        self.profiler = profiler
+        self.model_cache = model_cache
+        # Events are evaluated on a thread pool when > 1. Code blocks hold the GIL, so this only pays off for blocks
+        # that wait or on a free-threaded Python build.
+        self.event_workers = event_workers
+        # Every event interpreted in this run carries the same collection timestamp.
+        self.timestamp = datetime.now()
+        self.topology_meta = get_topology_metamodel()
+        self.evaluator = CodeEvaluator(profiler)
         self.ElementPropertiesChangedClass = self.topology_meta["ElementPropertiesChanged"]
         self.link_pattern = re.compile("\\[([\\s\\w-]*)\\]\\((.*)\\)")
 
     def model_from_file(self, model_file_name: str):
         try:
-            return self.topology_meta.model_from_file(model_file_name)
+            with self.profiler.stage("parse"):
+                if self.model_cache is not None:
+                    return self.model_cache.model_from_file(
+                        model_file_name, self.topology_meta, TOPOLOGY_TX, self._parse
+                    )
+                return compile_model(self.topology_meta.model_from_file(model_file_name))
         except TextXSyntaxError as e:
             raise Exception(e.message)
 
+    def _parse(self, text: str, model_file_name: str):
+        return compile_model(self.topology_meta.model_from_str(text, file_name=model_file_name))
+
     def interpret(self, model) -> TopologyFactory:
         defaults: Dict[str, Any] = {}
         if hasattr(model, "defaults") and model.defaults is not None:
-            defaults = self._index_properties(model.defaults.properties)
+            with self.profiler.stage("defaults"):
+                defaults = self._index_properties(model.defaults.properties)
         if hasattr(model, "components") and model.components is not None:
             components_ast = model.components
-            for component_ast in components_ast.components:
-                self._interpret_component(component_ast, defaults)
-            self._resolve_relations()
+            with self.profiler.stage("components", count=len(components_ast.components)):
+                for component_ast in components_ast.components:
+                    self._interpret_component(component_ast, defaults)
+            if not self.defer_resolution:
+                self.resolve_relations()
         if hasattr(model, "events") and model.events is not None:
             events_ast = model.events
-            for event_ast in events_ast.events:
-                self._interpret_event(event_ast, defaults)
+            with self.profiler.stage("events", count=len(events_ast.events)):
+                events = self._interpret_events(events_ast.events, defaults)
+                for event in events:
+                    self.factory.add_event(event)
 
         return self.factory
 
-    def _interpret_event(self, event_ast, defaults):
+    # Events only read the topology and are added to the factory once all of them are interpreted, in order, so their
+    # code blocks can run concurrently. Unless resolution is deferred, identifiers are resolved before the event
+    # processors run, every distinct identifier is looked up once.
+    def _interpret_events(self, events_ast: List[Any], defaults: Dict[str, Any]) -> List[Event]:
+        resolved: Optional[Dict[str, str]] = None if self.defer_resolution else {}
+        if self.event_workers <= 1 or len(events_ast) <= 1:
+            return [self._interpret_event(event_ast, defaults, self.evaluator, resolved) for event_ast in events_ast]
+        # Every worker takes a contiguous slice, so results come back in order with one task per worker.
+        workers = min(self.event_workers, len(events_ast))
+        size = -(-len(events_ast) // workers)
+        slices = [events_ast[start : start + size] for start in range(0, len(events_ast), size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            interpreted = pool.map(
+                lambda events_slice: self._interpret_event_slice(events_slice, defaults, resolved), slices
+            )
+            return [event for events in interpreted for event in events]
+
+    def _interpret_event_slice(
+        self, events_ast: List[Any], defaults: Dict[str, Any], resolved: Optional[Dict[str, str]]
+    ) -> List[Event]:
+        # A CodeEvaluator is not thread safe, every worker gets its own.
+        evaluator = CodeEvaluator(self.profiler)
+        return [self._interpret_event(event_ast, defaults, evaluator, resolved) for event_ast in events_ast]
+
+    def _interpret_event(
+        self, event_ast, defaults, evaluator: CodeEvaluator, resolved: Optional[Dict[str, str]]
+    ) -> Event:
         event = Event()
         properties = self._index_properties(event_ast.properties)
         ctx = TopologyContext(factory=self.factory, event=event)
-        property_interpreter = PropertyInterpreter(properties, defaults, "event", ctx, self.topology_meta)
+        property_interpreter = PropertyInterpreter(
+            properties, defaults, "event", ctx, self.topology_meta, evaluator
+        )
 
         event.msg_title = property_interpreter.get_string_property("title", "Unknown")
         property_interpreter.source_name = f"Event with title '{event.msg_title}"
         event.msg_text = property_interpreter.get_string_property("message", "")
         event.tags.extend(property_interpreter.merge_list_property("tags"))
-        event.timestamp = datetime.now()
+        event.timestamp = self.timestamp
         identifiers = property_interpreter.get_list_property("identifiers", [])
         if len(identifiers) == 0:
             raise Exception(f"Event must have at least 1 identifier '{event.msg_title}'.")
-        event.context.element_identifiers = self._resolve_identifiers(identifiers)
+        if resolved is not None:
+            identifiers = self._resolve_identifiers(identifiers, resolved)
+        event.context.element_identifiers = identifiers
 
         links = property_interpreter.get_list_property("links", [])
         for link in links:
@@ -264,27 +371,34 @@ class TopologyInterpreter:
             event.context.data = {"old": previous, "new": current}
 
         property_interpreter.run_processors(defaults_name="eventProcessor")
-        self.factory.add_event(event)
+        return event
+
+    # Events tend to point at the same few components, every distinct identifier is looked up once.
+    def resolve_event_identifiers(self, events: List[Event]):
+        resolved: Dict[str, str] = {}
+        for event in events:
+            event.context.element_identifiers = self._resolve_identifiers(event.context.element_identifiers, resolved)
 
-    def _resolve_identifiers(self, identifiers):
-        resolved_identifiers = []
+    def _resolve_identifiers(self, identifiers: List[str], resolved: Dict[str, str]) -> List[str]:
         for identifier in identifiers:
-            if self.factory.component_exists(identifier):
-                resolved_identifiers.append(identifier)
-            else:
-                target_component = self.factory.get_component_by_name(identifier, raise_not_found=False)
-                if target_component:
-                    resolved_identifiers.append(target_component.uid)
-                else:
-                    # Reference to another component on StackState Server
-                    resolved_identifiers.append(identifier)
-        return resolved_identifiers
+            if identifier not in resolved:
+                resolved[identifier] = self._resolve_identifier(identifier)
+        return [resolved[identifier] for identifier in identifiers]
+
+    def _resolve_identifier(self, identifier: str) -> str:
+        if self.factory.component_exists(identifier):
+            return identifier
+        target_component = self.factory.get_component_by_name(identifier, raise_not_found=False)
+        if target_component:
+            return target_component.uid
+        # Reference to another component on StackState Server
+        return identifier
 
     def _interpret_component(self, component_ast, defaults):
         properties = self._index_properties(component_ast.properties)
         ctx = TopologyContext(factory=self.factory)
         property_interpreter = PropertyInterpreter(
-            properties, defaults, component_ast.component_type, ctx, self.topology_meta
+            properties, defaults, component_ast.component_type, ctx, self.topology_meta, self.evaluator
         )
 
         repeat = range(0, 1)
@@ -316,26 +430,15 @@ class TopologyInterpreter:
             if len(component.properties.identifiers) == 0:
                 component.properties.identifiers.append(component.uid)
 
-            self._interpret_health(component, property_interpreter)
+            with self.profiler.stage("health"):
+                self._interpret_health(component, property_interpreter)
             self._interpret_relations(component, property_interpreter)
             self.factory.add_component(component)
 
-    def _resolve_relations(self):
-        components: List[Component] = self.factory.components.values()
-        for source in components:
-            for relation in source.relations:
-                if self.factory.component_exists(relation.target_id):
-                    self.factory.add_relation(relation.source_id, relation.target_id, relation.get_type())
-                else:
-                    target_component = self.factory.get_component_by_name(relation.target_id, raise_not_found=False)
-                    if target_component:
-                        self.factory.add_relation(relation.source_id, target_component.uid, relation.get_type())
-                    else:
-                        raise Exception(
-                            f"Failed to find related component '{relation.target_id}'. "
-                            f"Reference from component {source.uid}."
-                        )
-            source.relations = []
+    def resolve_relations(self):
+        resolver = RelationResolver(self.factory)
+        with self.profiler.stage("relations"):
+            self.factory.resolve_relations(resolver)
 
     @staticmethod
     def _interpret_relations(component: Component, property_interpreter: PropertyInterpreter):
@@ -352,10 +455,10 @@ class TopologyInterpreter:
 
             if reverse:
                 rel_id = f"{rel_parts[0]} --> {component.uid}"
-                relation = Relation({"source_id": rel_parts[0], "target_id": component.uid, "external_id": rel_id})
+                relation = Relation(source_id=rel_parts[0], target_id=component.uid, external_id=rel_id)
             else:
                 rel_id = f"{component.uid} --> {rel_parts[0]}"
-                relation = Relation({"source_id": component.uid, "target_id": rel_parts[0], "external_id": rel_id})
+                relation = Relation(source_id=component.uid, target_id=rel_parts[0], external_id=rel_id)
             relation.set_type(rel_type)
             component.relations.append(relation)
 
@@ -379,7 +482,7 @@ class TopologyInterpreter:
         health.health = health_state.upper()
         health.message = health_msg
         health.validate()
-        self.factory.health[health.check_id] = health
+        self.factory.add_health(health)
 
     @staticmethod
     def _index_properties(properties) -> Dict[str, Any]:
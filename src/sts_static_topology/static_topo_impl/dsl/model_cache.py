@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import tempfile
+import zlib
+from hashlib import sha256
+from typing import Any, Callable, List, Optional, Tuple
+
+from static_topo_impl.dsl.compiler import compile_code
+from textx.metamodel import TextXMetaModel
+from textx.model import get_location
+
+# Bump when compile_model changes what it stores on the model, cached models of the old format are then ignored.
+MODEL_CACHE_FORMAT = 2
+MODEL_SUFFIX = ".model"
+
+
+def grammar_digest(grammar: str) -> str:
+    return sha256(f"{MODEL_CACHE_FORMAT}:{grammar}".encode("utf-8")).hexdigest()
+
+
+# Parsed and compiled models kept on disk between runs, one file per topology file content. A model is stored as JSON,
+# a tree of nodes with their rule and attributes, and rebuilt with the classes of the running metamodel. Code blocks
+# are compiled again when loaded. Entries are keyed by the digest of the file content and of the grammar, a changed
+# file or grammar never finds a stale model. Files are written atomically and the least recently used ones are removed
+# once the directory grows past max_bytes.
+class ModelCache:
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.private: Optional[bool] = None
+
+    def model_from_file(
+        self, model_file_name: str, metamodel: TextXMetaModel, grammar: str, parse: Callable[[str, str], Any]
+    ) -> Any:
+        with open(model_file_name, "rb") as f:
+            content = f.read()
+        if not self._directory_is_private():
+            return parse(content.decode("utf-8"), model_file_name)
+        digest = grammar_digest(grammar)
+        path = os.path.join(self.directory, sha256(content).hexdigest()[:32] + digest[:16] + MODEL_SUFFIX)
+        model = self._load(path, digest, metamodel, model_file_name)
+        if model is not None:
+            self.hits += 1
+            return model
+        self.misses += 1
+        # Parse the content that was hashed, the file may change in between.
+        model = parse(content.decode("utf-8"), model_file_name)
+        self._store(path, digest, model)
+        return model
+
+    def _load(self, path: str, digest: str, metamodel: TextXMetaModel, model_file_name: str):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            cache_format, cached_digest, tree = json.loads(zlib.decompress(data))
+            if cache_format != MODEL_CACHE_FORMAT or cached_digest != digest:
+                return None
+            model = _decode(tree, metamodel, None, model_file_name)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable cached model '{path}' of '{model_file_name}': {e}")
+            self._remove(path)
+            return None
+        model._tx_filename = model_file_name
+        model._tx_metamodel = metamodel
+        # The modification time orders entries for eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return model
+
+    def _store(self, path: str, digest: str, model: Any):
+        try:
+            data = zlib.compress(json.dumps([MODEL_CACHE_FORMAT, digest, _encode(model)]).encode("utf-8"))
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except Exception:
+                self._remove(temp_path)
+                raise
+            self._evict()
+        except Exception as e:
+            # The cache only saves time, a run never fails on it.
+            logging.warning(f"Failed to cache model in '{self.directory}': {e}")
+
+    # Code blocks of cached models are run by the sync, so a directory that others can write to is not used.
+    def _directory_is_private(self) -> bool:
+        if self.private is None:
+            self.private = self._check_directory()
+        return self.private
+
+    def _check_directory(self) -> bool:
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            stat = os.stat(self.directory)
+        except OSError as e:
+            logging.warning(f"Model cache disabled, '{self.directory}' is not available: {e}")
+            return False
+        if hasattr(os, "geteuid") and (stat.st_uid != os.geteuid() or stat.st_mode & 0o022):
+            logging.warning(
+                f"Model cache disabled, '{self.directory}' must be owned by the current user and not be writable by "
+                "group or others."
+            )
+            return False
+        return True
+
+    def _evict(self):
+        entries: List[Tuple[float, int, str]] = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(MODEL_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Nodes become {"node": rule, "location": [line, col], "attributes": {...}} and folded constants {"constant": value}.
+# Compiled code is left out. A value JSON can not hold fails the store, the model is then not cached.
+def _encode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {"constant": value}
+    if not hasattr(value, "_tx_position"):
+        return value
+    attributes = {
+        k: _encode(v) for k, v in vars(value).items() if not k.startswith("_tx") and k not in ("parent", "compiled")
+    }
+    location = None
+    if value.__class__.__name__ == "PropertyCode":
+        # Cached models have no parser to compute locations with, the profiler reports code blocks by them.
+        position = get_location(value)
+        location = [position["line"], position["col"]]
+    return {"node": value.__class__.__name__, "location": location, "attributes": attributes}
+
+
+def _decode(value: Any, metamodel: TextXMetaModel, parent: Any, model_file_name: str) -> Any:
+    if isinstance(value, list):
+        return [_decode(v, metamodel, parent, model_file_name) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "constant" in value:
+        return value["constant"]
+    cls = metamodel[value["node"]]
+    obj = cls.__new__(cls)
+    for k, v in value["attributes"].items():
+        setattr(obj, k, _decode(v, metamodel, obj, model_file_name))
+    if parent is not None:
+        obj.parent = parent
+    location = value["location"]
+    if location is not None:
+        obj.location = f"{model_file_name}:{location[0]}:{location[1]}"
+    if value["node"] == "PropertyCode":
+        obj.compiled = compile_code(obj.code)
+    return obj
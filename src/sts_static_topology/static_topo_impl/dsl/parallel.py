@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import attr
+from static_topo_impl.dsl.compiler import copy_constant
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.dsl.model_cache import ModelCache
+from static_topo_impl.model.elements import Component, Event, HealthCheckState
+from static_topo_impl.model.factory import TopologyFactory
+
+
+# Workers hand back the native (dict) form of their elements, cached partials are rebuilt from it every cycle.
+@attr.s(kw_only=True)
+class PartialTopology:
+    path: str = attr.ib()
+    components: List[Dict[str, Any]] = attr.ib(factory=list)
+    health: List[Dict[str, Any]] = attr.ib(factory=list)
+    events: List[Dict[str, Any]] = attr.ib(factory=list)
+
+
+def interpret_topology_file(topo_file: str, model_cache: Optional[ModelCache] = None) -> PartialTopology:
+    interpreter = TopologyInterpreter(TopologyFactory(), defer_resolution=True, model_cache=model_cache)
+    factory = interpreter.interpret(interpreter.model_from_file(topo_file))
+    return PartialTopology(
+        path=topo_file,
+        components=[c.to_native() for c in factory.components.values()],
+        health=[h.to_native() for h in factory.health.values()],
+        events=[e.to_native() for e in factory.events],
+    )
+
+
+def interpret_topology_files(
+    topo_files: List[str], workers: int, model_cache: Optional[ModelCache] = None
+) -> List[PartialTopology]:
+    if len(topo_files) == 0:
+        return []
+    with ProcessPoolExecutor(max_workers=min(workers, len(topo_files))) as pool:
+        return list(pool.map(interpret_topology_file, topo_files, [model_cache] * len(topo_files)))
+
+
+def merge_partial_topology(partial: PartialTopology, factory: TopologyFactory, timestamp: datetime):
+    for component in partial.components:
+        # Cached partials are merged every cycle, so nothing may be shared with the components handed out.
+        factory.add_component(Component.from_native(copy_constant(component)))
+    for health in partial.health:
+        factory.add_health(HealthCheckState.from_native(health))
+    for event in partial.events:
+        event_model = Event.from_native(copy_constant(event))
+        event_model.timestamp = timestamp
+        factory.add_event(event_model)
+
+
+def resolve_partial_topology(interpreter: TopologyInterpreter, events: List[Event]):
+    interpreter.resolve_relations()
+    interpreter.resolve_event_identifiers(events)
@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import attr
+from static_topo_impl.model.elements import Component, Relation
+from static_topo_impl.model.factory import TopologyFactory
+
+
+# Relations of all components resolved in one pass, together with every problem found on the way so that a broken
+# topology file can be fixed in one go.
+@attr.s(kw_only=True)
+class RelationGraph:
+    edges: Dict[str, Relation] = attr.ib(factory=dict)
+    errors: List[str] = attr.ib(factory=list)
+
+
+class RelationResolver:
+    def __init__(self, factory: TopologyFactory):
+        self.factory = factory
+
+    def resolve(self, components: Iterable[Component]):
+        graph = self.build_graph(components)
+        self._raise_errors(graph.errors)
+        self.factory.relations.update(graph.edges)
+
+    # Relations kept by a streaming factory as (source id, target reference, type, declaring uid). Nothing is added
+    # until all of them resolve.
+    def resolve_pending(self, pending: List[Tuple[str, str, str, str]]):
+        errors: List[str] = []
+        seen: Set[str] = set()
+        resolved: List[Tuple[str, str, str]] = []
+        for source_id, target_ref, rel_type, declared_by in pending:
+            target_id = self.resolve_target(target_ref, declared_by, errors)
+            if target_id is None:
+                continue
+            rel_id = f"{source_id} --> {target_id}"
+            if rel_id in seen or self.factory.relation_exists(rel_id):
+                errors.append(f"Relation '{rel_id}' already exists. Reference from component {declared_by}.")
+                continue
+            seen.add(rel_id)
+            resolved.append((source_id, target_id, rel_type))
+        self._raise_errors(errors)
+        for source_id, target_id, rel_type in resolved:
+            self.factory.add_relation(source_id, target_id, rel_type)
+
+    @staticmethod
+    def _raise_errors(errors: List[str]):
+        if errors:
+            details = "\n".join(f"  {error}" for error in errors)
+            raise Exception(f"Failed to resolve {len(errors)} relation(s):\n{details}")
+
+    def build_graph(self, components: Iterable[Component]) -> RelationGraph:
+        graph = RelationGraph()
+        for source in components:
+            if not source.relations:
+                continue
+            for relation in source.relations:
+                target_id = self.resolve_target(relation.target_id, source.uid, graph.errors)
+                if target_id is None:
+                    continue
+                rel_id = f"{relation.source_id} --> {target_id}"
+                if rel_id in graph.edges or self.factory.relation_exists(rel_id):
+                    graph.errors.append(f"Relation '{rel_id}' already exists. Reference from component {source.uid}.")
+                    continue
+                # The pending relation becomes the resolved one, rather than building the same model again.
+                relation.target_id = target_id
+                relation.external_id = rel_id
+                graph.edges[rel_id] = relation
+            source.relations = []
+        return graph
+
+    def resolve_target(self, reference: str, source_uid: str, errors: List[str]) -> Optional[str]:
+        if self.factory.component_exists(reference):
+            return reference
+        uids = self.factory.uids_by_name.get(reference, [])
+        if len(uids) == 1:
+            return uids[0]
+        if len(uids) == 0:
+            errors.append(f"Failed to find related component '{reference}'. Reference from component {source_uid}.")
+        else:
+            errors.append(
+                f"Related component '{reference}' is ambiguous, it matches {', '.join(uids)}. "
+                f"Reference from component {source_uid}."
+            )
+        return None
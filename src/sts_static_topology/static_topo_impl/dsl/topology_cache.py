@@ -0,0 +1,158 @@
+import logging
+import os
+from datetime import datetime
+from hashlib import sha256
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+import attr
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.dsl.parallel import (PartialTopology,
+                                           interpret_topology_files,
+                                           merge_partial_topology,
+                                           resolve_partial_topology)
+from static_topo_impl.model.factory import TopologyFactory
+
+
+def list_topology_files(topo_dsl_files: List[str]) -> List[str]:
+    topo_files: List[str] = []
+    for topo_dsl_file in topo_dsl_files:
+        if topo_dsl_file.endswith(".topo"):
+            topo_files.append(topo_dsl_file)  # Single file
+        else:
+            topo_files.extend(
+                [os.path.join(topo_dsl_file, f) for f in os.listdir(topo_dsl_file) if f.endswith(".topo")]
+            )
+    return topo_files
+
+
+@attr.s(kw_only=True)
+class CachedTopologyFile:
+    path: str = attr.ib()
+    mtime: float = attr.ib()
+    size: int = attr.ib()
+    digest: str = attr.ib()
+    model: Any = attr.ib()
+    # What the file added when it was interpreted in order, with its relations as (source id, target id, type).
+    recorded: Optional[PartialTopology] = attr.ib(default=None)
+    relations: List[Tuple[str, str, str]] = attr.ib(factory=list)
+    partial: Optional[PartialTopology] = attr.ib(default=None)
+
+
+# Files are interpreted in order against one shared factory, so a file can only depend on the files before it.
+# Cached elements are reused for the unchanged files up to the first changed (or reordered) file. From there on
+# files are interpreted again, but unchanged files still reuse their parsed model. Elements are cached in native form,
+# as they were when their file was done, and rebuilt on every merge. When a processor of a later file changed them, the
+# cache ends before that file, so the change is made again by interpreting.
+# With parallel workers every file is interpreted on its own, so the partial topology of any unchanged file is reused.
+class TopologyCache:
+    def __init__(self):
+        self.files: Dict[str, CachedTopologyFile] = {}
+        self.order: List[str] = []
+
+    def interpret(
+        self, interpreter: TopologyInterpreter, topo_files: List[str], log: logging.Logger, workers: int = 0
+    ) -> TopologyFactory:
+        if workers > 1:
+            return self._interpret_parallel(interpreter, topo_files, log, workers)
+        factory = interpreter.factory
+        files: Dict[str, CachedTopologyFile] = {}
+        order: List[str] = []
+        stale = False
+        for index, topo_file in enumerate(topo_files):
+            entry, changed = self._lookup(topo_file)
+            changed = changed or entry.model is None
+            stale = stale or changed or index >= len(self.order) or self.order[index] != topo_file
+            if stale:
+                if changed:
+                    log.info(f"Processing '{topo_file}'")
+                    entry.model = interpreter.model_from_file(topo_file)
+                else:
+                    log.info(f"Processing '{topo_file}' (cached model)")
+                self._record(entry, interpreter)
+            else:
+                log.debug(f"Reusing cached topology of '{topo_file}'")
+                self._merge(entry, factory, interpreter.timestamp)
+            files[topo_file] = entry
+            order.append(topo_file)
+        self.files = files
+        self.order = order[: self._first_changed_later(order, factory)]
+        return factory
+
+    def _interpret_parallel(
+        self, interpreter: TopologyInterpreter, topo_files: List[str], log: logging.Logger, workers: int
+    ) -> TopologyFactory:
+        files: Dict[str, CachedTopologyFile] = {}
+        pending: List[CachedTopologyFile] = []
+        for topo_file in topo_files:
+            entry, changed = self._lookup(topo_file)
+            if changed or entry.partial is None:
+                log.info(f"Processing '{topo_file}'")
+                pending.append(entry)
+            else:
+                log.debug(f"Reusing cached topology of '{topo_file}'")
+            files[topo_file] = entry
+        partials = interpret_topology_files([entry.path for entry in pending], workers, interpreter.model_cache)
+        for entry, partial in zip(pending, partials):
+            entry.partial = partial
+        factory = interpreter.factory
+        events_before = len(factory.events)
+        for topo_file in topo_files:
+            merge_partial_topology(files[topo_file].partial, factory, interpreter.timestamp)
+        resolve_partial_topology(interpreter, factory.events[events_before:])
+        self.files = files
+        # Parallel entries hold no interpreted elements, so a later sequential run starts from scratch.
+        self.order = []
+        return factory
+
+    def _lookup(self, topo_file: str):
+        stat = os.stat(topo_file)
+        entry = self.files.get(topo_file)
+        if entry is not None and entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+            return entry, False
+        with open(topo_file, "rb") as f:
+            digest = sha256(f.read()).hexdigest()
+        if entry is not None and entry.digest == digest:
+            entry.mtime = stat.st_mtime
+            entry.size = stat.st_size
+            return entry, False
+        entry = CachedTopologyFile(path=topo_file, mtime=stat.st_mtime, size=stat.st_size, digest=digest, model=None)
+        return entry, True
+
+    @staticmethod
+    def _record(entry: CachedTopologyFile, interpreter: TopologyInterpreter):
+        factory = interpreter.factory
+        components_before = len(factory.components)
+        relations_before = len(factory.relations)
+        events_before = len(factory.events)
+        factory.health.changes = []
+        try:
+            interpreter.interpret(entry.model)
+            stored = factory.health.changes
+        finally:
+            factory.health.changes = None
+        # Elements are added at the end, only the ones of this file are visited.
+        added = len(factory.components) - components_before
+        components = reversed(list(islice(reversed(factory.components.values()), added)))
+        added = len(factory.relations) - relations_before
+        relations = reversed(list(islice(reversed(factory.relations.values()), added)))
+        entry.recorded = PartialTopology(
+            path=entry.path,
+            components=[c.to_native() for c in components],
+            health=[factory.health[check_id].to_native() for check_id in dict.fromkeys(stored)],
+            events=[e.to_native() for e in factory.events[events_before:]],
+        )
+        entry.relations = [(r.source_id, r.target_id, r.get_type()) for r in relations]
+
+    def _first_changed_later(self, order: List[str], factory: TopologyFactory) -> int:
+        for index, topo_file in enumerate(order):
+            for component in self.files[topo_file].recorded.components:
+                if factory.components[component["uid"]].to_native() != component:
+                    return index
+        return len(order)
+
+    @staticmethod
+    def _merge(entry: CachedTopologyFile, factory: TopologyFactory, timestamp: datetime):
+        merge_partial_topology(entry.recorded, factory, timestamp)
+        for source_id, target_id, rel_type in entry.relations:
+            factory.add_relation(source_id, target_id, rel_type)
@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import attr
+from static_topo_impl.model import stackstate
+
+# Compact records for the topology that is built while interpreting. They have the same attributes and helpers as the
+# schematics models in model/stackstate.py, which stay in use where data is validated or crosses the wire. Records are
+# converted to primitives by model/serializers.py.
+
+HEALTH_STATES = ("CLEAR", "DEVIATING", "CRITICAL")
+
+
+@attr.s(kw_only=True, slots=True)
+class ComponentType:
+    name: str = attr.ib(default=None)
+
+
+@attr.s(kw_only=True, slots=True)
+class Relation:
+    external_id: str = attr.ib(default=None)
+    relation_type: Optional[ComponentType] = attr.ib(default=None)
+    source_id: str = attr.ib(default=None)
+    target_id: str = attr.ib(default=None)
+    properties: Dict[str, Any] = attr.ib(factory=lambda: {"labels": []})
+
+    def set_type(self, name: str):
+        if self.relation_type is None:
+            self.relation_type = ComponentType(name=name)
+        else:
+            self.relation_type.name = name
+
+    def get_type(self) -> str:
+        if self.relation_type is None:
+            return ""
+        else:
+            return self.relation_type.name
+
+
+@attr.s(kw_only=True, slots=True)
+class ComponentProperties:
+    name: str = attr.ib(default=None)
+    layer: str = attr.ib(default="Unknown")
+    domain: str = attr.ib(default="Unknown")
+    environment: str = attr.ib(default="Unknown")
+    labels: List[str] = attr.ib(factory=list)
+    identifiers: List[str] = attr.ib(factory=list)
+    custom_properties: Dict[str, Any] = attr.ib(factory=dict)
+
+    def add_label(self, label: str):
+        self.labels.append(label)
+
+    def add_label_kv(self, key: str, value: str):
+        self.labels.append(f"{key}:{value}")
+
+    def add_identifier(self, identifier: str):
+        if identifier not in self.identifiers:
+            self.identifiers.append(identifier)
+
+    def update_properties(self, properties: Dict[str, Any]):
+        self.custom_properties.update(properties)
+
+    def add_property(self, name: str, value: Any):
+        self.custom_properties[name] = value
+
+    def get_property(self, name: str):
+        return self.custom_properties[name]
+
+    def dedup_labels(self):
+        labels = set(self.labels)
+        self.labels = list(labels)
+
+
+@attr.s(kw_only=True, slots=True)
+class Component:
+    uid: str = attr.ib(default=None)
+    component_type: Optional[ComponentType] = attr.ib(default=None)
+    properties: ComponentProperties = attr.ib(factory=ComponentProperties)
+    relations: List[Relation] = attr.ib(factory=list)
+
+    def set_type(self, name: str):
+        if self.component_type is None:
+            self.component_type = ComponentType(name=name)
+        else:
+            self.component_type.name = name
+
+    def get_type(self) -> str:
+        return self.component_type.name
+
+    def get_name(self) -> str:
+        return self.properties.name
+
+    def set_name(self, name: str):
+        self.properties.name = name
+
+    def to_native(self) -> Dict[str, Any]:
+        return attr.asdict(self)
+
+    @staticmethod
+    def from_native(native: Dict[str, Any]) -> "Component":
+        component_type = native["component_type"]
+        return Component(
+            uid=native["uid"],
+            component_type=None if component_type is None else ComponentType(**component_type),
+            properties=ComponentProperties(**native["properties"]),
+            relations=[relation_from_native(r) for r in native["relations"]],
+        )
+
+
+def relation_from_native(native: Dict[str, Any]) -> Relation:
+    relation_type = native["relation_type"]
+    return Relation(
+        external_id=native["external_id"],
+        relation_type=None if relation_type is None else ComponentType(**relation_type),
+        source_id=native["source_id"],
+        target_id=native["target_id"],
+        properties=native["properties"],
+    )
+
+
+@attr.s(kw_only=True, slots=True)
+class HealthCheckState:
+    check_id: str = attr.ib(default=None)
+    check_name: str = attr.ib(default=None)
+    topo_identifier: str = attr.ib(default=None)
+    message: Optional[str] = attr.ib(default=None)
+    health: str = attr.ib(default=None)
+
+    # Only a state that is not obviously valid goes through the schematics model, for its error message.
+    def validate(self):
+        if (
+            self.health in HEALTH_STATES
+            and self.check_id is not None
+            and self.check_name is not None
+            and self.topo_identifier is not None
+        ):
+            return
+        stackstate.HealthCheckState(self.to_native()).validate()
+
+    def to_native(self) -> Dict[str, Any]:
+        return attr.asdict(self)
+
+    @staticmethod
+    def from_native(native: Dict[str, Any]) -> "HealthCheckState":
+        return HealthCheckState(**native)
+
+
+@attr.s(kw_only=True, slots=True)
+class SourceLink:
+    title: str = attr.ib(default=None)
+    url: str = attr.ib(default=None)
+
+
+@attr.s(kw_only=True, slots=True)
+class EventContext:
+    category: Optional[str] = attr.ib(default=None)
+    data: Dict[str, Any] = attr.ib(factory=dict)
+    element_identifiers: List[str] = attr.ib(factory=list)
+    source: str = attr.ib(default="StaticTopology")
+    source_links: List[SourceLink] = attr.ib(factory=list)
+
+
+@attr.s(kw_only=True, slots=True)
+class Event:
+    context: EventContext = attr.ib(factory=EventContext)
+    event_type: str = attr.ib(default=None)
+    msg_title: str = attr.ib(default=None)
+    msg_text: str = attr.ib(default=None)
+    source_type_name: str = attr.ib(default="StaticTopology")
+    tags: List[str] = attr.ib(factory=list)
+    timestamp: Optional[datetime] = attr.ib(default=None)
+
+    def to_native(self) -> Dict[str, Any]:
+        return attr.asdict(self)
+
+    @staticmethod
+    def from_native(native: Dict[str, Any]) -> "Event":
+        context = native["context"]
+        return Event(
+            context=EventContext(
+                category=context["category"],
+                data=context["data"],
+                element_identifiers=context["element_identifiers"],
+                source=context["source"],
+                source_links=[SourceLink(**link) for link in context["source_links"]],
+            ),
+            event_type=native["event_type"],
+            msg_title=native["msg_title"],
+            msg_text=native["msg_text"],
+            source_type_name=native["source_type_name"],
+            tags=native["tags"],
+            timestamp=native["timestamp"],
+        )
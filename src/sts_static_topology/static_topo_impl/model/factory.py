@@ -1,15 +1,97 @@
-from typing import Dict, List, Optional
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from typing import (TYPE_CHECKING, Any, Dict, ItemsView, Iterator, KeysView,
+                    List, Optional, Set, Tuple, ValuesView)
 
-from static_topo_impl.model.stackstate import (Component, Event,
-                                               HealthCheckState, Relation)
+import attr
+from static_topo_impl.model.elements import (HEALTH_STATES, Component, Event,
+                                             HealthCheckState, Relation)
+
+if TYPE_CHECKING:
+    from static_topo_impl.dsl.resolver import RelationResolver
+
+
+# Health states by check id, as a dict, with indexes by health state and by topology identifier. Counts per state are
+# O(1) and the states of one health value or one component are found without scanning. The indexes hold check ids in
+# insertion order, a state is indexed when it is stored, so a changed state has to be stored again. The (health,
+# topology identifier) a check id was indexed under is kept, a state changed in place is unindexed from where it was.
+class HealthStore(MutableMapping):
+    def __init__(self):
+        self.states: Dict[str, HealthCheckState] = {}
+        self.check_ids_by_state: Dict[str, Dict[str, None]] = {state: {} for state in HEALTH_STATES}
+        self.check_ids_by_identifier: Dict[str, Dict[str, None]] = {}
+        self.indexed: Dict[str, Tuple[str, str]] = {}
+        # When a list, the check ids of stored states are appended to it, so a caller can tell what one file stored.
+        self.changes: Optional[List[str]] = None
+
+    def __getitem__(self, check_id: str) -> HealthCheckState:
+        return self.states[check_id]
+
+    def __setitem__(self, check_id: str, health: HealthCheckState):
+        if check_id in self.states:
+            self._unindex(check_id)
+        self.states[check_id] = health
+        if self.changes is not None:
+            self.changes.append(check_id)
+        self.indexed[check_id] = (health.health, health.topo_identifier)
+        self.check_ids_by_state.setdefault(health.health, {})[check_id] = None
+        self.check_ids_by_identifier.setdefault(health.topo_identifier, {})[check_id] = None
+
+    def __delitem__(self, check_id: str):
+        self._unindex(check_id)
+        del self.states[check_id]
+
+    def __contains__(self, check_id: Any) -> bool:
+        return check_id in self.states
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.states)
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def keys(self) -> KeysView[str]:
+        return self.states.keys()
+
+    def values(self) -> ValuesView[HealthCheckState]:
+        return self.states.values()
+
+    def items(self) -> ItemsView[str, HealthCheckState]:
+        return self.states.items()
+
+    def count(self, state: str) -> int:
+        return len(self.check_ids_by_state.get(state, ()))
+
+    def counts(self) -> Dict[str, int]:
+        return {state: len(check_ids) for state, check_ids in self.check_ids_by_state.items()}
+
+    def with_state(self, state: str) -> List[HealthCheckState]:
+        return [self.states[check_id] for check_id in self.check_ids_by_state.get(state, ())]
+
+    def for_identifier(self, topo_identifier: str) -> List[HealthCheckState]:
+        return [self.states[check_id] for check_id in self.check_ids_by_identifier.get(topo_identifier, ())]
+
+    def _unindex(self, check_id: str):
+        state, topo_identifier = self.indexed.pop(check_id)
+        del self.check_ids_by_state[state][check_id]
+        check_ids = self.check_ids_by_identifier[topo_identifier]
+        del check_ids[check_id]
+        if not check_ids:
+            del self.check_ids_by_identifier[topo_identifier]
 
 
 class TopologyFactory:
     def __init__(self):
         self.components: Dict[str, Component] = {}
         self.relations: Dict[str, Relation] = {}
-        self.health: Dict[str, HealthCheckState] = {}
+        self.health = HealthStore()
         self.events: List[Event] = []
+        self.uids_by_name: Dict[str, List[str]] = {}
+        self.uids_by_type_and_name: Dict[Tuple[str, str], List[str]] = {}
+        self.uids_by_type: Dict[str, List[str]] = {}
+        self.uids_by_label: Dict[str, Dict[str, None]] = {}
+        # Memoized query results by (kind, key), an added component drops the results of its type and labels.
+        self.query_cache: Dict[Tuple[str, str], Tuple[Any, ...]] = {}
 
     def add_event(self, event: Event):
         self.events.append(event)
@@ -18,6 +100,35 @@ class TopologyFactory:
         if component.uid in self.components:
             raise Exception(f"Component '{component.uid}' already exists.")
         self.components[component.uid] = component
+        self._index_component(component)
+
+    def _index_component(self, component: Component):
+        name = component.get_name()
+        self.uids_by_name.setdefault(name, []).append(component.uid)
+        self.uids_by_type_and_name.setdefault((component.get_type(), name), []).append(component.uid)
+        self.uids_by_type.setdefault(component.get_type(), []).append(component.uid)
+        self.query_cache.pop(("type", component.get_type()), None)
+        for label in component.properties.labels:
+            self.uids_by_label.setdefault(label, {})[component.uid] = None
+            self.query_cache.pop(("label", label), None)
+
+    # Queries for code blocks and processors. Results are tuples in the order the components were added, shared
+    # between callers until a component of the same type or with the same label is added. Labels are indexed when a
+    # component is added, its processors have run by then, but labels a later processor adds to it are not found.
+    def components_by_type(self, component_type: str) -> Tuple[Component, ...]:
+        return self._query("type", component_type, self.uids_by_type)
+
+    def components_by_label(self, label: str) -> Tuple[Component, ...]:
+        return self._query("label", label, self.uids_by_label)
+
+    def _query(self, kind: str, key: str, index: Dict[str, Any]) -> Tuple[Any, ...]:
+        result = self.query_cache.get((kind, key))
+        if result is None:
+            result = self.query_cache[(kind, key)] = tuple(self.get_component(uid) for uid in index.get(key, ()))
+        return result
+
+    def add_health(self, health: HealthCheckState):
+        self.health[health.check_id] = health
 
     def get_component(self, uid: str) -> Component:
         return self.components[uid]
@@ -25,35 +136,129 @@ class TopologyFactory:
     def get_component_by_name_and_type(
         self, component_type: str, name: str, raise_not_found: bool = True
     ) -> Optional[Component]:
-        result = [c for c in self.components.values() if c.component_type == component_type and c.get_name() == name]
-        if len(result) == 1:
-            return result[0]
-        elif len(result) == 0:
-            if raise_not_found:
-                raise Exception(f"Component ({component_type}, {name}) not found.")
-            return None
-        else:
-            raise Exception(f"More than 1 result found for Component ({component_type}, {name}) search.")
+        result = self.uids_by_type_and_name.get((component_type, name), [])
+        return self._single_component(result, f"{component_type}, {name}", raise_not_found)
 
     def get_component_by_name(self, name: str, raise_not_found: bool = True) -> Optional[Component]:
-        result = [c for c in self.components.values() if c.get_name() == name]
+        result = self.uids_by_name.get(name, [])
+        return self._single_component(result, name, raise_not_found)
+
+    def _single_component(self, result: List[str], search: str, raise_not_found: bool) -> Optional[Component]:
         if len(result) == 1:
-            return result[0]
+            return self.get_component(result[0])
         elif len(result) == 0:
             if raise_not_found:
-                raise Exception(f"Component ({name}) not found.")
+                raise Exception(f"Component ({search}) not found.")
             return None
         else:
-            raise Exception(f"More than 1 result found for Component ({name}) search.")
+            raise Exception(f"More than 1 result found for Component ({search}) search.")
 
     def component_exists(self, uid: str) -> bool:
         return uid in self.components
 
+    def relation_exists(self, rel_id: str) -> bool:
+        return rel_id in self.relations
+
+    # Relations are kept with the components that declared them until every component is known.
+    def resolve_relations(self, resolver: "RelationResolver"):
+        resolver.resolve(self.components.values())
+
     def add_relation(self, source_id: str, target_id: str, rel_type: str = "uses") -> Relation:
         rel_id = f"{source_id} --> {target_id}"
         if rel_id in self.relations:
             raise Exception(f"Relation '{rel_id}' already exists.")
-        relation = Relation({"source_id": source_id, "target_id": target_id, "external_id": rel_id})
+        relation = Relation(source_id=source_id, target_id=target_id, external_id=rel_id)
         relation.set_type(rel_type)
         self.relations[rel_id] = relation
         return relation
+
+
+# Receives topology elements as soon as they are interpreted.
+class TopologySink(ABC):
+    @abstractmethod
+    def add_component(self, component: Component):
+        pass
+
+    @abstractmethod
+    def add_relation(self, relation: Relation):
+        pass
+
+    @abstractmethod
+    def add_health(self, health: HealthCheckState):
+        pass
+
+
+# What a streaming factory remembers of a component that has been handed to the sink.
+@attr.s(kw_only=True, slots=True, frozen=True)
+class ComponentRef:
+    uid: str = attr.ib()
+    name: str = attr.ib()
+    component_type: str = attr.ib()
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get_type(self) -> str:
+        return self.component_type
+
+
+# Hands components and health states to a sink instead of keeping them. Only a reference and the name index are kept
+# per component, as relations and event identifiers are resolved by uid or name, and the unresolved relations until
+# they are resolved. Component lookups return a ComponentRef. Labels are not kept, so type and label queries are not
+# available.
+class StreamingTopologyFactory(TopologyFactory):
+    def __init__(self, sink: TopologySink):
+        super().__init__()
+        self.sink = sink
+        self.refs: Dict[str, ComponentRef] = {}
+        self.relation_ids: Set[str] = set()
+        # Source id, target reference, relation type and the uid of the component that declared the relation.
+        self.pending_relations: List[Tuple[str, str, str, str]] = []
+
+    def add_component(self, component: Component):
+        if component.uid in self.refs:
+            raise Exception(f"Component '{component.uid}' already exists.")
+        self.refs[component.uid] = ComponentRef(
+            uid=component.uid, name=component.get_name(), component_type=component.get_type()
+        )
+        self.uids_by_name.setdefault(component.get_name(), []).append(component.uid)
+        for relation in component.relations:
+            self.pending_relations.append((relation.source_id, relation.target_id, relation.get_type(), component.uid))
+        component.relations = []
+        self.sink.add_component(component)
+
+    def add_health(self, health: HealthCheckState):
+        self.sink.add_health(health)
+
+    def get_component(self, uid: str) -> ComponentRef:
+        return self.refs[uid]
+
+    def get_component_by_name_and_type(
+        self, component_type: str, name: str, raise_not_found: bool = True
+    ) -> Optional[ComponentRef]:
+        result = [uid for uid in self.uids_by_name.get(name, []) if self.refs[uid].component_type == component_type]
+        return self._single_component(result, f"{component_type}, {name}", raise_not_found)
+
+    def _query(self, kind: str, key: str, index: Dict[str, Any]) -> Tuple[Any, ...]:
+        raise Exception(f"Components can not be queried by {kind} when streaming.")
+
+    def component_exists(self, uid: str) -> bool:
+        return uid in self.refs
+
+    def relation_exists(self, rel_id: str) -> bool:
+        return rel_id in self.relation_ids
+
+    def add_relation(self, source_id: str, target_id: str, rel_type: str = "uses") -> Relation:
+        rel_id = f"{source_id} --> {target_id}"
+        if rel_id in self.relation_ids:
+            raise Exception(f"Relation '{rel_id}' already exists.")
+        self.relation_ids.add(rel_id)
+        relation = Relation(source_id=source_id, target_id=target_id, external_id=rel_id)
+        relation.set_type(rel_type)
+        self.sink.add_relation(relation)
+        return relation
+
+    def resolve_relations(self, resolver: "RelationResolver"):
+        pending = self.pending_relations
+        self.pending_relations = []
+        resolver.resolve_pending(pending)
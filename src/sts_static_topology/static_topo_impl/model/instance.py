@@ -1,7 +1,8 @@
 from typing import List
 
 from schematics import Model
-from schematics.types import IntType, ListType, ModelType, StringType, URLType
+from schematics.types import (BooleanType, FloatType, IntType, ListType,
+                              ModelType, StringType, URLType)
 
 
 # Use when running as an agent-check
@@ -10,6 +11,10 @@ class InstanceInfo(Model):
     instance_type: str = StringType(default="static_topo_dsl")
     min_collection_interval: int = IntType(default=300)
     topo_files: List[str] = ListType(StringType(), default=[])
+    parallel_workers: int = IntType(default=0)  # Interpret topology files in worker processes when > 1
+    event_workers: int = IntType(default=0)  # Evaluate event code blocks on a thread pool when > 1
+    streaming: bool = BooleanType(default=False)  # Send components to the agent while interpreting
+    profile: bool = BooleanType(default=False)  # Report stage timings as static_topology.stage.* gauges
 
 
 # Rest of configuration used when running in cli mode.
@@ -20,6 +25,13 @@ class HealthSyncSpec(Model):
     repeat_interval_seconds: int = IntType(required=False, default=1800)  # 30 Minutes
 
 
+class RetrySpec(Model):
+    max_retries: int = IntType(required=False, default=3)
+    backoff_seconds: float = FloatType(required=False, default=0.5)  # Doubled on every retry
+    max_backoff_seconds: float = FloatType(required=False, default=30)
+    status_codes: List[int] = ListType(IntType(), default=[500, 502, 503, 504])
+
+
 class StackStateSpec(Model):
     receiver_url: str = URLType(required=True)
     api_key: str = StringType(required=True)
@@ -27,8 +39,23 @@ class StackStateSpec(Model):
     instance_url: str = StringType()
     health_sync: HealthSyncSpec = ModelType(HealthSyncSpec, required=False, default=None)
     internal_hostname: str = StringType(required=True, default="localhost")
+    max_batch_elements: int = IntType(required=False, default=0)  # Components and relations per intake call
+    max_batch_bytes: int = IntType(required=False, default=0)  # Serialized element bytes per intake call
+    retry: RetrySpec = ModelType(RetrySpec, required=False, default=None)
+    delta_sync: bool = BooleanType(required=False, default=False)  # Only send what changed since the last publish
+    full_snapshot_interval_seconds: int = IntType(required=False, default=1800)  # 30 Minutes
+    skip_unchanged: bool = BooleanType(required=False, default=False)  # Skip channels identical to the last publish
+    force_refresh_cycles: int = IntType(required=False, default=10)  # Publish unchanged channels every N cycles
+    max_concurrency: int = IntType(required=False, default=1)  # Intake calls in flight at the same time
+    connect_timeout_seconds: float = FloatType(required=False, default=10)  # Per attempt of an intake call
+    read_timeout_seconds: float = FloatType(required=False, default=60)  # Between bytes of the receiver's response
 
 
 class Configuration(Model):
     stackstate: StackStateSpec = ModelType(StackStateSpec, required=True)
     topo_files: List[str] = ListType(StringType(), default=[])
+    parallel_workers: int = IntType(default=0)  # Interpret topology files in worker processes when > 1
+    event_workers: int = IntType(default=0)  # Evaluate event code blocks on a thread pool when > 1
+    streaming: bool = BooleanType(default=False)  # Publish components while interpreting, see TopologyStream
+    model_cache_dir: str = StringType(default=None)  # Keep parsed topology files here between runs
+    model_cache_max_bytes: int = IntType(default=64 * 1024 * 1024)
@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Optional
+
+from static_topo_impl.model.elements import (Component, ComponentProperties,
+                                             ComponentType, Event,
+                                             EventContext, HealthCheckState,
+                                             Relation, SourceLink)
+
+# Hand written equivalents of `to_primitive(role="public")` of the schematics models in model/stackstate.py, for the
+# element records in model/elements.py. They produce exactly the same primitives (serialized names, field order, None
+# handling) without going through the generic schematics export machinery.
+
+
+def _copy_list(value: Optional[List[Any]]) -> Optional[List[Any]]:
+    return None if value is None else list(value)
+
+
+def _copy_dict(value: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return None if value is None else dict(value)
+
+
+def _type_to_primitive(component_type: Optional[ComponentType]) -> Optional[Dict[str, Any]]:
+    return None if component_type is None else {"name": component_type.name}
+
+
+def properties_to_primitive(properties: ComponentProperties) -> Dict[str, Any]:
+    return {
+        "name": properties.name,
+        "layer": properties.layer,
+        "domain": properties.domain,
+        "environment": properties.environment,
+        "labels": _copy_list(properties.labels),
+        "identifiers": _copy_list(properties.identifiers),
+        "custom_properties": _copy_dict(properties.custom_properties),
+    }
+
+
+def component_to_primitive(component: Component) -> Dict[str, Any]:
+    properties = component.properties
+    return {
+        "externalId": component.uid,
+        "type": _type_to_primitive(component.component_type),
+        "data": None if properties is None else properties_to_primitive(properties),
+    }
+
+
+def relation_to_primitive(relation: Relation) -> Dict[str, Any]:
+    return {
+        "externalId": relation.external_id,
+        "type": _type_to_primitive(relation.relation_type),
+        "sourceId": relation.source_id,
+        "targetId": relation.target_id,
+        "data": _copy_dict(relation.properties),
+    }
+
+
+def health_to_primitive(health: HealthCheckState) -> Dict[str, Any]:
+    return {
+        "checkStateId": health.check_id,
+        "name": health.check_name,
+        "topologyElementIdentifier": health.topo_identifier,
+        "message": health.message,
+        "health": health.health,
+    }
+
+
+def _source_link_to_primitive(source_link: SourceLink) -> Dict[str, Any]:
+    return {"title": source_link.title, "url": source_link.url}
+
+
+# EventContext does not serialize None, which schematics also applies to empty containers and None items.
+def _event_context_to_primitive(context: EventContext) -> Dict[str, Any]:
+    primitive: Dict[str, Any] = {}
+    if context.category is not None:
+        primitive["category"] = context.category
+    if context.data:
+        data = {k: v for k, v in context.data.items() if v is not None}
+        if data:
+            primitive["data"] = data
+    if context.element_identifiers:
+        identifiers = [i for i in context.element_identifiers if i is not None]
+        if identifiers:
+            primitive["element_identifiers"] = identifiers
+    if context.source is not None:
+        primitive["source"] = context.source
+    if context.source_links:
+        primitive["source_links"] = [_source_link_to_primitive(s) for s in context.source_links if s is not None]
+    return primitive
+
+
+def event_to_primitive(event: Event) -> Dict[str, Any]:
+    context = event.context
+    timestamp = event.timestamp
+    return {
+        "context": None if context is None else _event_context_to_primitive(context),
+        "event_type": event.event_type,
+        "msg_title": event.msg_title,
+        "msg_text": event.msg_text,
+        "source_type_name": event.source_type_name,
+        "tags": _copy_list(event.tags),
+        "timestamp": None if timestamp is None else int(round(timestamp.timestamp())),
+    }
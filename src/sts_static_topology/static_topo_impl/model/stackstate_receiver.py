@@ -3,8 +3,8 @@ from typing import Any, Dict, List
 
 from schematics import Model
 from schematics.transforms import blacklist, wholelist
-from schematics.types import (BooleanType, DictType, IntType, ListType,
-                              ModelType, StringType)
+from schematics.types import (BooleanType, DictType, FloatType, IntType,
+                              ListType, ModelType, StringType)
 from static_topo_impl.model.stackstate import (AnyType, Component, Event,
                                                HealthCheckState, Relation,
                                                TimestampType)
@@ -70,9 +70,36 @@ class ReceiverApi(Model):
         roles = {"public": wholelist()}
 
 
+class StageStats(Model):
+    name: str = StringType(required=True)
+    seconds: float = FloatType(default=0.0)
+    count: int = IntType(default=0)
+
+
+class SnippetStats(Model):
+    location: str = StringType(required=True)
+    expression: str = StringType()
+    seconds: float = FloatType(default=0.0)
+    calls: int = IntType(default=0)
+
+
+class ProfileStats(Model):
+    stages: List[StageStats] = ListType(ModelType(StageStats), default=[])
+    slowest_snippets: List[SnippetStats] = ListType(ModelType(SnippetStats), default=[])
+
+
 class SyncStats(Model):
     components: int = IntType()
     relations: int = IntType()
     checks: int = IntType()
     events: int = IntType()
     payloads: List[str] = ListType(StringType, default=[])
+    changed_components: int = IntType(default=0)
+    changed_relations: int = IntType(default=0)
+    deleted: int = IntType(default=0)
+    channels_sent: int = IntType(default=0)
+    channels_skipped: int = IntType(default=0)
+    requests: int = IntType(default=0)
+    retries: int = IntType(default=0)
+    request_latencies_ms: List[float] = ListType(FloatType, default=[])
+    profile: ProfileStats = ModelType(ProfileStats, default=None)  # Only when profiling is enabled
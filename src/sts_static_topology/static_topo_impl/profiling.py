@@ -0,0 +1,92 @@
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+import attr
+from static_topo_impl.model.stackstate_receiver import (ProfileStats,
+                                                        SnippetStats,
+                                                        StageStats)
+from textx.model import get_location
+
+
+@attr.s(kw_only=True)
+class StageTiming:
+    seconds: float = attr.ib(default=0.0)
+    count: int = attr.ib(default=0)
+
+
+@attr.s(kw_only=True)
+class SnippetTiming:
+    location: str = attr.ib()
+    expression: str = attr.ib()
+    seconds: float = attr.ib(default=0.0)
+    calls: int = attr.ib(default=0)
+
+
+# Wall time and counts per stage of a sync: discovery, parse, defaults, components, code, relations, health, events,
+# serialization, then compression and http towards the receiver or publish and emission towards the agent. Stages
+# nest, code blocks and health states are timed within the components stage that runs them. A disabled profiler
+# records nothing and is what every stage gets by default.
+class Profiler:
+    def __init__(self, enabled: bool = True, top_snippets: int = 10):
+        self.enabled = enabled
+        self.top_snippets = top_snippets
+        self.stages: Dict[str, StageTiming] = {}
+        # Time spent per code block, by the identity of its PropertyCode node.
+        self.snippets: Dict[int, SnippetTiming] = {}
+        # Intake calls and event code blocks can run on several threads.
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, count: int = 1) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, count)
+
+    def record(self, name: str, seconds: float, count: int = 1):
+        with self.lock:
+            timing = self.stages.get(name)
+            if timing is None:
+                timing = self.stages[name] = StageTiming()
+            timing.seconds += seconds
+            timing.count += count
+
+    def record_snippet(self, code_ast: Any, expression: str, seconds: float):
+        with self.lock:
+            timing = self.snippets.get(id(code_ast))
+            if timing is None:
+                # Models loaded from the model cache carry the location, they have no parser to compute it with.
+                location = getattr(code_ast, "location", None)
+                if location is None:
+                    position = get_location(code_ast)
+                    location = f"{position['filename'] or '<string>'}:{position['line']}:{position['col']}"
+                timing = self.snippets[id(code_ast)] = SnippetTiming(location=location, expression=expression)
+            timing.seconds += seconds
+            timing.calls += 1
+
+    def slowest_snippets(self) -> List[SnippetTiming]:
+        return heapq.nlargest(self.top_snippets, self.snippets.values(), key=lambda s: s.seconds)
+
+    def to_stats(self) -> ProfileStats:
+        stats = ProfileStats()
+        stats.stages = [
+            StageStats({"name": name, "seconds": timing.seconds, "count": timing.count})
+            for name, timing in self.stages.items()
+        ]
+        stats.slowest_snippets = [
+            SnippetStats(
+                {"location": s.location, "expression": s.expression, "seconds": s.seconds, "calls": s.calls}
+            )
+            for s in self.slowest_snippets()
+        ]
+        return stats
+
+
+DISABLED = Profiler(enabled=False)
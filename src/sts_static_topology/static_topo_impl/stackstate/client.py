@@ -1,104 +1,410 @@
 import datetime
 import json
 import logging
-import zlib
-from hashlib import md5
-from typing import Dict, List
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Any, Callable, Deque, Dict, Iterable, Iterator, List,
+                    Optional, Set, Tuple)
 from urllib.parse import quote
 
 import requests
-from static_topo_impl.model.instance import StackStateSpec
-from static_topo_impl.model.stackstate import (Component, Event,
-                                               HealthCheckState, Relation)
+from static_topo_impl.model.elements import (Component, Event,
+                                             HealthCheckState, Relation)
+from static_topo_impl.model.factory import TopologySink
+from static_topo_impl.model.instance import RetrySpec, StackStateSpec
+from static_topo_impl.model.serializers import (component_to_primitive,
+                                                event_to_primitive,
+                                                health_to_primitive,
+                                                relation_to_primitive)
 from static_topo_impl.model.stackstate_receiver import (
     HealthStream, HealthSync, HealthSyncStartSnapshot, Instance, ReceiverApi,
     SyncStats, TopologySync)
+from static_topo_impl.profiling import DISABLED, Profiler
+from static_topo_impl.stackstate.encoder import (CompressedJson, RawJson,
+                                                 deflate_json, encode_element)
+from static_topo_impl.stackstate.sync_state import (TopologySyncState,
+                                                    digest, fingerprint)
+
+
+# Elements per intake call of a stream when no batch limit is configured.
+STREAM_BATCH_ELEMENTS = 1000
+
+
+# Runs calls on up to max_concurrency threads, or one after the other when it is 1. No more calls are taken than can be
+# in flight, so lazily built payloads are not all held at once. wait() raises the first failure of a call.
+class CallQueue:
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency) if max_concurrency > 1 else None
+        self.futures: Deque[Future] = deque()
+
+    def submit(self, call: Callable[[], Any]):
+        if self.pool is None:
+            call()
+            return
+        if len(self.futures) >= self.max_concurrency:
+            self.futures.popleft().result()
+        self.futures.append(self.pool.submit(call))
+
+    def wait(self):
+        while self.futures:
+            self.futures.popleft().result()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
 
 
 class StackStateClient:
-    def __init__(self, config: StackStateSpec):
+    def __init__(
+        self, config: StackStateSpec, sync_state: Optional[TopologySyncState] = None, profiler: Profiler = DISABLED
+    ):
         self.config = config
+        self.sync_state = sync_state
+        self.profiler = profiler
         self.intake_url = f"{self.config.receiver_url}/stsAgent/intake?api_key={self.config.api_key}"
+        self.retry: RetrySpec = self.config.retry or RetrySpec()
+        self.max_concurrency = max(1, self.config.max_concurrency)
+        self.timeout = (self.config.connect_timeout_seconds, self.config.read_timeout_seconds)
+        # Keeps connections to the receiver alive between payloads and batches.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(10, self.max_concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Stats are shared by the payloads that are posted concurrently.
+        self.stats_lock = threading.Lock()
+
+    def __enter__(self) -> "StackStateClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def stream(self, dry_run=False, stats=SyncStats()) -> "TopologyStream":
+        return TopologyStream(self, dry_run, stats)
+
+    def publish_all(
+        self,
+        components: List[Component],
+        relations: List[Relation],
+        health_checks: List[HealthCheckState],
+        events: List[Event],
+        dry_run=False,
+        stats=SyncStats(),
+    ) -> SyncStats:
+        self.publish(components, relations, dry_run, stats)
+        # Health states and events refer to topology elements, so they follow the topology but not each other.
+        self._run_concurrently(
+            [
+                lambda: self.publish_health_checks(health_checks, dry_run, stats),
+                lambda: self.publish_events(events, dry_run, stats),
+            ],
+            dry_run,
+        )
+        return stats
 
     def publish_health_checks(
         self, health_checks: List[HealthCheckState], dry_run=False, stats=SyncStats()
     ) -> SyncStats:
         stats.checks = len(health_checks)
-        payload = self._prepare_health_sync_payload(health_checks)
-        return self._post_data(payload, dry_run, stats)
+        with self.profiler.stage("serialization", count=len(health_checks)):
+            check_states = [health_to_primitive(check) for check in health_checks]
+        channel_digest = None
+        if self._skips_unchanged():
+            channel_digest = digest(fingerprint(encode_element(check)) for check in check_states)
+        if self._skip_channel("health", channel_digest, stats):
+            return stats
+        self.post_data(self.prepare_health_sync_payload(check_states), dry_run, stats)
+        return self._channel_sent("health", channel_digest, stats)
 
     def publish_events(self, events: List[Event], dry_run=False, stats=SyncStats()) -> SyncStats:
         stats.events = len(events)
-        payload = self._prepare_event_sync_payload(events)
-        return self._post_data(payload, dry_run, stats)
+        with self.profiler.stage("serialization", count=len(events)):
+            event_primitives = [event_to_primitive(event) for event in events]
+        channel_digest = None
+        if self._skips_unchanged():
+            # Events are stamped when interpreted, so the timestamp is left out of the digest.
+            channel_digest = digest(
+                fingerprint(encode_element({k: v for k, v in event.items() if k != "timestamp"}))
+                for event in event_primitives
+            )
+        if self._skip_channel("events", channel_digest, stats):
+            return stats
+        self.post_data(self._prepare_event_sync_payload(event_primitives), dry_run, stats)
+        return self._channel_sent("events", channel_digest, stats)
 
     def publish(
         self, components: List[Component], relations: List[Relation], dry_run=False, stats=SyncStats()
     ) -> SyncStats:
         stats.components = len(components)
         stats.relations = len(relations)
-        payload = self._prepare_topo_payload(components, relations)
-        return self._post_data(payload, dry_run, stats)
+        state = self.sync_state
+        compare = state is not None and (self.config.delta_sync or self.config.skip_unchanged)
+        if not compare:
+            # A full snapshot that is not compared with the last publish, elements are encoded as their batch is built.
+            stats.changed_components = len(components)
+            stats.changed_relations = len(relations)
+            payloads = self._prepare_topo_payloads(
+                self._encode_elements(components, component_to_primitive),
+                self._encode_elements(relations, relation_to_primitive),
+                [],
+                snapshot=True,
+            )
+            self._post_batches(payloads, dry_run, stats)
+            return self._channel_sent("topology", None, stats)
 
-    def _post_data(self, payload: ReceiverApi, dry_run: bool, stats: SyncStats) -> SyncStats:
-        if dry_run:
-            stats.payloads.append(json.dumps(payload.to_primitive(role="public"), indent=4))
+        # The complete topology is fingerprinted and compared with the last publish before anything is sent.
+        with self.profiler.stage("serialization", count=len(components) + len(relations)):
+            encoded_components = {c.uid: encode_element(component_to_primitive(c)) for c in components}
+            encoded_relations = {r.external_id: encode_element(relation_to_primitive(r)) for r in relations}
+        component_prints = {uid: fingerprint(c) for uid, c in encoded_components.items()}
+        relation_prints = {rid: fingerprint(r) for rid, r in encoded_relations.items()}
+
+        snapshot_due = state.snapshot_due(self.config.full_snapshot_interval_seconds)
+        channel_digest = None
+        if self._skips_unchanged():
+            channel_digest = digest(list(component_prints.values()) + [b"|"] + list(relation_prints.values()))
+        if not (self.config.delta_sync and snapshot_due) and self._skip_channel("topology", channel_digest, stats):
             return stats
-        serialized_payload = json.dumps(payload.to_primitive(role="public"))
 
-        zipped = zlib.compress(serialized_payload.encode("utf-8"))
+        snapshot = not self.config.delta_sync or snapshot_due
+        if snapshot:
+            changed_components = list(encoded_components.keys())
+            changed_relations = list(encoded_relations.keys())
+            delete_ids: List[str] = []
+        else:
+            changed_components = state.changed(state.components, component_prints)
+            changed_relations = state.changed(state.relations, relation_prints)
+            delete_ids = state.removed(state.components, component_prints) + state.removed(
+                state.relations, relation_prints
+            )
+        stats.changed_components = len(changed_components)
+        stats.changed_relations = len(changed_relations)
+        stats.deleted = len(delete_ids)
+
+        if snapshot or changed_components or changed_relations or delete_ids:
+            payloads = self._prepare_topo_payloads(
+                (encoded_components[uid] for uid in changed_components),
+                (encoded_relations[rid] for rid in changed_relations),
+                delete_ids,
+                snapshot,
+            )
+            self._post_batches(payloads, dry_run, stats)
+        state.update(component_prints, relation_prints, snapshot)
+        return self._channel_sent("topology", channel_digest, stats)
+
+    def _encode_elements(self, elements: Iterable[Any], to_primitive: Callable[[Any], Any]) -> Iterator[RawJson]:
+        for element in elements:
+            with self.profiler.stage("serialization"):
+                encoded = encode_element(to_primitive(element))
+            yield encoded
+
+    def _skips_unchanged(self) -> bool:
+        return self.config.skip_unchanged and self.sync_state is not None
+
+    # Channels whose content did not change since their last successful publish are skipped, but at least every
+    # `force_refresh_cycles` cycle they are sent again to keep the receiver's snapshots alive. Without skipping no
+    # channel digest is computed.
+    def _skip_channel(self, channel: str, channel_digest: Optional[bytes], stats: SyncStats) -> bool:
+        if channel_digest is not None and self._skips_unchanged():
+            if self.sync_state.skip(channel, channel_digest, self.config.force_refresh_cycles):
+                logging.info(f"Skipping unchanged {channel}.")
+                with self.stats_lock:
+                    stats.channels_skipped += 1
+                return True
+        return False
+
+    def _channel_sent(self, channel: str, channel_digest: Optional[bytes], stats: SyncStats) -> SyncStats:
+        with self.stats_lock:
+            stats.channels_sent += 1
+        if channel_digest is not None and self.sync_state is not None:
+            self.sync_state.sent(channel, channel_digest)
+        return stats
+
+    # The first and last batch of a snapshot open and close it on the receiver (a delta sends its deletes last), so only
+    # the batches in between are posted concurrently. Payloads are taken from the iterator as they are posted, the last
+    # one is held back until the ones before it are done.
+    def _post_batches(self, payloads: Iterator[Dict[str, Any]], dry_run: bool, stats: SyncStats):
+        self.post_data(next(payloads), dry_run, stats)
+        last: List[Dict[str, Any]] = []
+
+        def middle() -> Iterator[Callable[[], Any]]:
+            for payload in payloads:
+                if last:
+                    yield lambda previous=last.pop(): self.post_data(previous, dry_run, stats)
+                last.append(payload)
+
+        self._run_concurrently(middle(), dry_run)
+        for payload in last:
+            self.post_data(payload, dry_run, stats)
+
+    # Dry runs stay sequential so their payloads are reported in a stable order.
+    def _run_concurrently(self, calls: Iterable[Callable[[], Any]], dry_run: bool):
+        queue = CallQueue(1 if dry_run else self.max_concurrency)
+        try:
+            for call in calls:
+                queue.submit(call)
+            queue.wait()
+        finally:
+            queue.close()
+
+    # Building, batching and posting of payloads, shared with TopologyStream.
+    def post_data(self, payload: Dict[str, Any], dry_run: bool, stats: SyncStats) -> SyncStats:
+        if dry_run:
+            stats.payloads.append(json.dumps(payload, indent=4, default=RawJson.decode))
+            return stats
+        with self.profiler.stage("compression"):
+            body = deflate_json(payload)
         logging.debug(
             "payload_size=%d, compressed_size=%d, compression_ratio=%.3f"
-            % (len(serialized_payload), len(zipped), float(len(serialized_payload)) / float(len(zipped)))
+            % (body.raw_size, len(body), float(body.raw_size) / float(len(body)))
         )
         headers: Dict[str, str] = {
             "Content-Type": "application/json",
             "Content-Encoding": "deflate",
-            "Content-MD5": md5(zipped).hexdigest(),
+            "Content-MD5": body.md5,
         }
-        self._handle_failed_call(requests.post(self.intake_url, data=zipped, headers=headers))
+        with self.profiler.stage("http"):
+            response = self._post_with_retries(body, headers, stats)
+        self._handle_failed_call(response)
         return stats
 
-    def _prepare_health_sync_payload(self, checks: List[HealthCheckState]) -> ReceiverApi:
+    def _post_with_retries(
+        self, data: CompressedJson, headers: Dict[str, str], stats: SyncStats
+    ) -> requests.Response:
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.post(self.intake_url, data=data, headers=headers, timeout=self.timeout)
+                failure = None if response.status_code not in self.retry.status_codes else f"{response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                failure = str(e)
+            with self.stats_lock:
+                stats.requests += 1
+                stats.request_latencies_ms.append(round((time.perf_counter() - start) * 1000, 3))
+            if failure is None or attempt >= self.retry.max_retries:
+                break
+            backoff = min(self.retry.backoff_seconds * 2 ** attempt, self.retry.max_backoff_seconds)
+            attempt += 1
+            with self.stats_lock:
+                stats.retries += 1
+            logging.warning(f"Call to receiver failed ({failure}), retry {attempt} in {backoff:.2f} seconds.")
+            time.sleep(backoff)
+        if response is None:
+            raise Exception(f"Failed to call receiver after {attempt + 1} attempts: {failure}")
+        return response
+
+    def prepare_health_sync_payload(
+        self, check_states: List[Dict[str, Any]], start_snapshot: bool = True, stop_snapshot: bool = True
+    ) -> Dict[str, Any]:
         health_stream = HealthStream()
         spec = self.config.health_sync
         encoded_source = quote(spec.source_name, safe="")
         encoded_stream = quote(spec.stream_id, safe="")
         health_stream.urn = f"urn:health:{encoded_source}:{encoded_stream}"
 
-        start_snapshot = HealthSyncStartSnapshot()
-        start_snapshot.expiry_interval_s = spec.expiry_interval_seconds
-        start_snapshot.repeat_interval_s = spec.repeat_interval_seconds
+        start = HealthSyncStartSnapshot()
+        start.expiry_interval_s = spec.expiry_interval_seconds
+        start.repeat_interval_s = spec.repeat_interval_seconds
 
         sync = HealthSync()
-        sync.start_snapshot = start_snapshot
+        sync.start_snapshot = start
         sync.stream = health_stream
-        sync.check_states = checks
 
         payload = self._prepare_receiver_payload()
         payload.health = [sync]
-        return payload
+        primitive = payload.to_primitive(role="public")
+        sync_primitive = primitive["health"][0]
+        sync_primitive["check_states"] = check_states
+        # A snapshot spread over several payloads is started by the first and stopped by the last one.
+        if not start_snapshot:
+            del sync_primitive["start_snapshot"]
+        if not stop_snapshot:
+            del sync_primitive["stop_snapshot"]
+        return primitive
 
-    def _prepare_event_sync_payload(self, events: List[Event]) -> ReceiverApi:
-        payload = self._prepare_receiver_payload()
+    def _prepare_event_sync_payload(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        primitive = self._prepare_receiver_payload().to_primitive(role="public")
         for event in events:
-            event_list = payload.events.setdefault(event.event_type, [])
+            event_list = primitive["events"].setdefault(event["event_type"], [])
             event_list.append(event)
-        return payload
+        return primitive
+
+    # Elements are spread over as many intake calls as the batch limits require. For a snapshot only the first batch
+    # starts it and only the last one stops it. A delta carries no snapshot markers and sends its deletes last.
+    # Batches are built from the iterators as payloads are requested, one batch ahead to know which one is last.
+    def _prepare_topo_payloads(
+        self, components: Iterable[RawJson], relations: Iterable[RawJson], delete_ids: List[str], snapshot: bool
+    ) -> Iterator[Dict[str, Any]]:
+        batches = self._batch_elements(components, relations)
+        batch_components, batch_relations = next(batches)
+        first = True
+        for next_batch in batches:
+            yield self.prepare_topo_payload(
+                batch_components, batch_relations, [], start_snapshot=snapshot and first, stop_snapshot=False
+            )
+            batch_components, batch_relations = next_batch
+            first = False
+        yield self.prepare_topo_payload(
+            batch_components, batch_relations, delete_ids, start_snapshot=snapshot and first, stop_snapshot=snapshot
+        )
 
-    def _prepare_topo_payload(self, components: List[Component], relations: List[Relation]) -> ReceiverApi:
+    def prepare_topo_payload(
+        self,
+        components: List[RawJson],
+        relations: List[RawJson],
+        delete_ids: List[str],
+        start_snapshot: bool,
+        stop_snapshot: bool,
+    ) -> Dict[str, Any]:
         instance = Instance()
         instance.instance_type = self.config.instance_type
         instance.url = self.config.instance_url
 
         topology_sync = TopologySync()
         topology_sync.instance = instance
-        topology_sync.components = components
-        topology_sync.relations = relations
+        topology_sync.start_snapshot = start_snapshot
+        topology_sync.stop_snapshot = stop_snapshot
+        topology_sync.delete_ids = delete_ids
 
         payload = self._prepare_receiver_payload()
         payload.topologies = [topology_sync]
-        return payload
+        primitive = payload.to_primitive(role="public")
+        primitive["topologies"][0]["components"] = components
+        primitive["topologies"][0]["relations"] = relations
+        return primitive
+
+    # Yields at least one batch, an empty one when there are no elements.
+    def _batch_elements(
+        self, components: Iterable[RawJson], relations: Iterable[RawJson]
+    ) -> Iterator[Tuple[List[RawJson], List[RawJson]]]:
+        batch_components: List[RawJson] = []
+        batch_relations: List[RawJson] = []
+        batch_size = 0
+        for elements, is_component in ((components, True), (relations, False)):
+            for element in elements:
+                if self.batch_full(len(batch_components) + len(batch_relations), batch_size, len(element)):
+                    yield batch_components, batch_relations
+                    batch_components, batch_relations, batch_size = [], [], 0
+                (batch_components if is_component else batch_relations).append(element)
+                batch_size += len(element)
+        yield batch_components, batch_relations
+
+    def batch_full(self, batch_count: int, batch_size: int, element_size: int, max_elements: int = 0) -> bool:
+        max_elements = self.config.max_batch_elements or max_elements
+        max_bytes = self.config.max_batch_bytes or 0
+        if batch_count == 0:
+            return False
+        return (max_elements > 0 and batch_count >= max_elements) or (
+            max_bytes > 0 and batch_size + element_size > max_bytes
+        )
 
     def _prepare_receiver_payload(self) -> ReceiverApi:
         payload = ReceiverApi()
@@ -118,3 +424,108 @@ class StackStateClient:
             logging.error("Response: %s" % response.text)
             raise Exception(msg)
         return response
+
+
+# Publishes a topology snapshot while it is being interpreted. Components and relations are encoded as they arrive and
+# sent once a batch is full, one batch is held back so the last one can stop the snapshot. Batches in between are
+# posted on up to max_concurrency threads while interpretation goes on. Health states are batched the same way in a
+# health snapshot that stays open until close. Delta sync and skipping of unchanged channels need the complete topology
+# and do not apply to a stream.
+class TopologyStream(TopologySink):
+    def __init__(self, client: StackStateClient, dry_run: bool, stats: SyncStats):
+        self.client = client
+        self.dry_run = dry_run
+        self.stats = stats
+        self.stats.components = 0
+        self.stats.relations = 0
+        self.stats.checks = 0
+        self.components: List[RawJson] = []
+        self.relations: List[RawJson] = []
+        self.batch_size = 0
+        self.started = False
+        # The health batch by check id, a later state of a check replaces the earlier one like in the factory. Across
+        # batches the receiver does the same within the snapshot, only the check ids are kept to count them.
+        self.check_states: Dict[str, RawJson] = {}
+        self.health_size = 0
+        self.health_started = False
+        self.check_ids: Set[str] = set()
+        self.queue = CallQueue(1 if dry_run else client.max_concurrency)
+        if client.config.delta_sync or client.config.skip_unchanged:
+            logging.warning("Delta sync and skip_unchanged do not apply to streaming, a full snapshot is published.")
+
+    def add_component(self, component: Component):
+        with self.client.profiler.stage("serialization"):
+            element = encode_element(component_to_primitive(component))
+        self._add(element, is_component=True)
+        self.stats.components += 1
+
+    def add_relation(self, relation: Relation):
+        with self.client.profiler.stage("serialization"):
+            element = encode_element(relation_to_primitive(relation))
+        self._add(element, is_component=False)
+        self.stats.relations += 1
+
+    def add_health(self, health: HealthCheckState):
+        with self.client.profiler.stage("serialization"):
+            element = encode_element(health_to_primitive(health))
+        previous = self.check_states.get(health.check_id)
+        if previous is not None:
+            self.health_size -= len(previous)
+        elif self.client.batch_full(len(self.check_states), self.health_size, len(element), STREAM_BATCH_ELEMENTS):
+            self._flush_health(stop_snapshot=False)
+        self.check_states[health.check_id] = element
+        self.health_size += len(element)
+        self.check_ids.add(health.check_id)
+        self.stats.checks = len(self.check_ids)
+
+    def close(self) -> SyncStats:
+        try:
+            self._flush(stop_snapshot=True)
+            self._flush_health(stop_snapshot=True)
+        finally:
+            self.queue.close()
+        return self.stats
+
+    # Ends a stream that failed before close. A started snapshot is not stopped, a stop would make the receiver remove
+    # every component that was not sent yet. It stays open until the next sync starts a new one.
+    def abort(self):
+        self.queue.close()
+        if self.started or self.health_started:
+            logging.error(
+                "Streaming sync failed after its snapshot was started, the partial snapshot is left open on the "
+                "receiver without a stop."
+            )
+
+    def _add(self, element: RawJson, is_component: bool):
+        batch_count = len(self.components) + len(self.relations)
+        if self.client.batch_full(batch_count, self.batch_size, len(element), STREAM_BATCH_ELEMENTS):
+            self._flush(stop_snapshot=False)
+        (self.components if is_component else self.relations).append(element)
+        self.batch_size += len(element)
+
+    def _flush(self, stop_snapshot: bool):
+        payload = self.client.prepare_topo_payload(
+            self.components, self.relations, [], start_snapshot=not self.started, stop_snapshot=stop_snapshot
+        )
+        self._post(payload, first=not self.started, last=stop_snapshot)
+        self.started = True
+        self.components = []
+        self.relations = []
+        self.batch_size = 0
+
+    def _flush_health(self, stop_snapshot: bool):
+        payload = self.client.prepare_health_sync_payload(
+            list(self.check_states.values()), start_snapshot=not self.health_started, stop_snapshot=stop_snapshot
+        )
+        self._post(payload, first=not self.health_started, last=stop_snapshot)
+        self.health_started = True
+        self.check_states = {}
+        self.health_size = 0
+
+    def _post(self, payload: Dict[str, Any], first: bool, last: bool):
+        if not first and not last:
+            self.queue.submit(lambda: self.client.post_data(payload, self.dry_run, self.stats))
+        else:
+            # A snapshot starts before and stops after every batch in between is done.
+            self.queue.wait()
+            self.client.post_data(payload, self.dry_run, self.stats)
@@ -0,0 +1,105 @@
+import json
+import zlib
+from hashlib import md5
+from typing import Any, Iterator, List
+
+FLUSH_SIZE = 64 * 1024
+
+
+class RawJson:
+    # An element that is already encoded, so batches can be sized and assembled without serializing it again.
+    __slots__ = ("json",)
+
+    def __init__(self, value: str):
+        self.json = value
+
+    def __len__(self):
+        return len(self.json)
+
+    @staticmethod
+    def decode(value: Any) -> Any:
+        if isinstance(value, RawJson):
+            return json.loads(value.json)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_element(primitive: Any) -> RawJson:
+    return RawJson(json.dumps(primitive))
+
+
+# Yields the same text as json.dumps(value), a piece at a time, with RawJson values written as they are.
+def iter_json(value: Any) -> Iterator[str]:
+    if isinstance(value, RawJson):
+        yield value.json
+    elif isinstance(value, dict):
+        if len(value) == 0:
+            yield "{}"
+            return
+        separator = "{"
+        for key, item in value.items():
+            yield f"{separator}{json.dumps(str(key))}: "
+            yield from iter_json(item)
+            separator = ", "
+        yield "}"
+    elif isinstance(value, (list, tuple)):
+        if len(value) == 0:
+            yield "[]"
+            return
+        separator = "["
+        for item in value:
+            yield separator
+            yield from iter_json(item)
+            separator = ", "
+        yield "]"
+    else:
+        yield json.dumps(value)
+
+
+# Deflated JSON of one payload as the chunks the compressor produced. requests posts an iterable with a length as it
+# is, with a Content-Length header, so the chunks are never joined. They are kept because the Content-MD5 header goes
+# out before the body and retries iterate them again, a payload is as large as the batch limits allow.
+class CompressedJson:
+    __slots__ = ("chunks", "size", "raw_size", "md5")
+
+    def __init__(self, chunks: List[bytes], raw_size: int, md5_digest: str):
+        self.chunks = chunks
+        self.size = sum(len(chunk) for chunk in chunks)
+        self.raw_size = raw_size
+        self.md5 = md5_digest
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.chunks)
+
+    def __len__(self):
+        return self.size
+
+
+# The text of json.dumps(value) goes into the compressor FLUSH_SIZE characters at a time and the digest is updated with
+# every compressed chunk, the text of the payload is never held as a whole.
+def deflate_json(value: Any) -> CompressedJson:
+    compressor = zlib.compressobj()
+    checksum = md5()
+    chunks: List[bytes] = []
+    pending: List[str] = []
+    pending_size = 0
+    raw_size = 0
+
+    def add(chunk: bytes):
+        if chunk:
+            chunks.append(chunk)
+            checksum.update(chunk)
+
+    for piece in iter_json(value):
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= FLUSH_SIZE:
+            data = "".join(pending).encode("utf-8")
+            raw_size += len(data)
+            add(compressor.compress(data))
+            pending = []
+            pending_size = 0
+    data = "".join(pending).encode("utf-8")
+    raw_size += len(data)
+    add(compressor.compress(data))
+    add(compressor.flush())
+    return CompressedJson(chunks, raw_size, checksum.hexdigest())
@@ -0,0 +1,56 @@
+import time
+from hashlib import md5
+from typing import Dict, Iterable, List, Optional
+
+from static_topo_impl.stackstate.encoder import RawJson
+
+
+def fingerprint(element: RawJson) -> bytes:
+    return md5(element.json.encode("utf-8")).digest()
+
+
+def digest(fingerprints: Iterable[bytes]) -> bytes:
+    hasher = md5()
+    for element_print in fingerprints:
+        hasher.update(element_print)
+    return hasher.digest()
+
+
+# What the receiver was last sent, kept between collection cycles so that only the difference has to be published.
+class TopologySyncState:
+    def __init__(self):
+        self.components: Dict[str, bytes] = {}
+        self.relations: Dict[str, bytes] = {}
+        self.last_snapshot: Optional[float] = None
+        # Digest of the last successful publish of each channel (topology, health, events) and the number of cycles
+        # it has been skipped since.
+        self.digests: Dict[str, bytes] = {}
+        self.skipped_cycles: Dict[str, int] = {}
+
+    def snapshot_due(self, interval_seconds: int) -> bool:
+        return self.last_snapshot is None or time.time() - self.last_snapshot >= interval_seconds
+
+    @staticmethod
+    def changed(published: Dict[str, bytes], current: Dict[str, bytes]) -> List[str]:
+        return [element_id for element_id, digest in current.items() if published.get(element_id) != digest]
+
+    @staticmethod
+    def removed(published: Dict[str, bytes], current: Dict[str, bytes]) -> List[str]:
+        return [element_id for element_id in published if element_id not in current]
+
+    def skip(self, channel: str, channel_digest: bytes, refresh_cycles: int) -> bool:
+        skipped = self.skipped_cycles.get(channel, 0)
+        if self.digests.get(channel) != channel_digest or skipped + 1 >= refresh_cycles:
+            return False
+        self.skipped_cycles[channel] = skipped + 1
+        return True
+
+    def sent(self, channel: str, channel_digest: bytes):
+        self.digests[channel] = channel_digest
+        self.skipped_cycles[channel] = 0
+
+    def update(self, components: Dict[str, bytes], relations: Dict[str, bytes], snapshot: bool):
+        self.components = components
+        self.relations = relations
+        if snapshot:
+            self.last_snapshot = time.time()
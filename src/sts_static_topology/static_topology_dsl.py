@@ -3,6 +3,7 @@ from stackstate_checks.base import (AgentCheck, ConfigurationError,
                                     HealthStream, HealthStreamUrn,
                                     TopologyInstance)
 from static_topo_impl.agent_processor import AgentProcessor
+from static_topo_impl.dsl.topology_cache import TopologyCache
 from static_topo_impl.model.instance import InstanceInfo
 
 
@@ -11,6 +12,7 @@ class StaticTopologyDslCheck(AgentCheck):
 
     def __init__(self, name, init_config, agentConfig, instances=None):
         super().__init__(name, init_config, agentConfig, instances)
+        self.topology_cache = TopologyCache()
 
     def get_instance_key(self, instance):
         if "instance_url" not in instance:
@@ -25,7 +27,7 @@ class StaticTopologyDslCheck(AgentCheck):
         return TopologyInstance(instance_type, instance_url)
 
     def check(self, instance):
-        AgentProcessor(instance, self).process()
+        AgentProcessor(instance, self, self.topology_cache).process()
 
     def get_health_stream(self, instance):
         return HealthStream(HealthStreamUrn(instance.instance_type, "static_health"), expiry_seconds=0)
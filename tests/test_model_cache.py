@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import zlib
+
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.dsl.model_cache import ModelCache
+from static_topo_impl.model.factory import TopologyFactory
+from static_topo_impl.profiling import DISABLED, Profiler
+
+SAMPLE = "tests/resources/conf.d/static_topology_dsl.d/sample.topo"
+
+
+def interpret(cache: ModelCache, topo_file: str, profiler: Profiler = DISABLED) -> TopologyFactory:
+    interpreter = TopologyInterpreter(TopologyFactory(), profiler=profiler, model_cache=cache)
+    return interpreter.interpret(interpreter.model_from_file(topo_file))
+
+
+def topology(factory: TopologyFactory):
+    return (
+        [c.to_native() for c in factory.components.values()],
+        sorted(factory.relations),
+        [h.to_native() for h in factory.health.values()],
+        [dict(e.to_native(), timestamp=None) for e in factory.events],
+    )
+
+
+def test_cached_model_interprets_like_parsed(tmp_path):
+    cache = ModelCache(str(tmp_path / "cache"))
+    parsed = interpret(cache, SAMPLE)
+    profiler = Profiler()
+    cached = interpret(cache, SAMPLE, profiler)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert topology(cached) == topology(parsed)
+    snippets = profiler.slowest_snippets()
+    assert snippets and all(s.location.startswith(f"{SAMPLE}:") for s in snippets)
+    # Entries are data, never unpickled code.
+    (entry,) = os.listdir(cache.directory)
+    with open(os.path.join(cache.directory, entry), "rb") as f:
+        assert json.loads(zlib.decompress(f.read()))[2]["node"] == "TopologyModel"
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    cache = ModelCache(str(tmp_path / "cache"))
+    topo_file = str(tmp_path / "hosts.topo")
+    with open(topo_file, "w") as f:
+        f.write("components {\n  Host(id one, name one)\n}\n")
+    interpret(cache, topo_file)
+    with open(topo_file, "w") as f:
+        f.write("components {\n  Host(id one, name one)\n  Host(id two, name two)\n}\n")
+    factory = interpret(cache, topo_file)
+    assert cache.misses == 2
+    assert "two" in factory.components
+
+
+def test_unreadable_entries_are_replaced_and_size_is_bounded(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = ModelCache(directory)
+    interpret(cache, SAMPLE)
+    (entry,) = os.listdir(directory)
+    with open(os.path.join(directory, entry), "wb") as f:
+        f.write(b"garbage")
+    assert len(interpret(cache, SAMPLE).components) == 3
+    assert cache.misses == 2
+
+    # Only the most recently stored model fits.
+    cache = ModelCache(directory, max_bytes=os.path.getsize(os.path.join(directory, entry)))
+    other = str(tmp_path / "other.topo")
+    shutil.copy(SAMPLE, other)
+    with open(other, "a") as f:
+        f.write("\n")
+    interpret(cache, other)
+    assert len(os.listdir(directory)) == 1
+    assert os.listdir(directory) != [entry]
+
+
+def test_shared_directory_is_not_used(tmp_path, caplog):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    cache = ModelCache(str(directory))
+    assert len(interpret(cache, SAMPLE).components) == 3
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert os.listdir(directory) == []
+    assert "Model cache disabled" in caplog.text
+
@@ -0,0 +1,43 @@
+from static_topo_impl.cli_processor import CliProcessor
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.model.factory import TopologyFactory
+from static_topo_impl.model.instance import Configuration
+from static_topo_impl.profiling import Profiler
+
+SAMPLE = "tests/resources/conf.d/static_topology_dsl.d/sample.topo"
+
+
+def test_interpreter_stages_and_snippets():
+    profiler = Profiler(top_snippets=2)
+    interpreter = TopologyInterpreter(TopologyFactory(), profiler=profiler)
+    interpreter.interpret(interpreter.model_from_file(SAMPLE))
+
+    assert {"parse", "defaults", "components", "code", "relations", "health", "events"} <= set(profiler.stages)
+    assert profiler.stages["components"].count == 3
+    assert profiler.stages["health"].count == 3
+    slowest = profiler.slowest_snippets()
+    assert len(slowest) == 2
+    assert slowest[0].seconds >= slowest[1].seconds
+    assert all(s.location.split(":")[0].endswith("sample.topo") for s in slowest)
+
+
+def test_profile_is_reported_in_sync_stats():
+    config = Configuration(
+        {
+            "stackstate": {
+                "receiver_url": "http://127.0.0.1:7077",
+                "api_key": "xxx",
+                "instance_type": "static_topo_dsl",
+                "instance_url": "test",
+                "health_sync": {"stream_id": "test"},
+            },
+            "topo_files": [SAMPLE],
+        }
+    )
+    stats = CliProcessor(config, profiler=Profiler()).run(dry_run=True)
+    stages = {stage.name: stage for stage in stats.profile.stages}
+    assert {"discovery", "parse", "components", "serialization"} <= set(stages)
+    assert stages["serialization"].count == 3 + 2 + 3 + 1
+    assert stats.profile.slowest_snippets[0].calls >= 1
+
+    assert CliProcessor(config).run(dry_run=True).profile is None
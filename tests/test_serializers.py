@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import attr
+import pytest
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.model import elements
+from static_topo_impl.model.factory import TopologyFactory
+from static_topo_impl.model.serializers import (component_to_primitive,
+                                                event_to_primitive,
+                                                health_to_primitive,
+                                                properties_to_primitive,
+                                                relation_to_primitive)
+from static_topo_impl.model.stackstate import (Component,
+                                               ComponentProperties, Event,
+                                               HealthCheckState, Relation,
+                                               SourceLink)
+
+
+@pytest.fixture(scope="module")
+def factory() -> TopologyFactory:
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.model_from_file("tests/resources/share/topologies/sample.topo")
+    return interpreter.interpret(model)
+
+
+# The schematics model holding the same data as an element record.
+def as_model(model_class, record):
+    return model_class(attr.asdict(record))
+
+
+def test_components(factory):
+    for component in factory.components.values():
+        model = as_model(Component, component)
+        assert component_to_primitive(component) == model.to_primitive(role="public")
+        assert properties_to_primitive(component.properties) == model.properties.to_primitive()
+
+
+def test_relations(factory):
+    for relation in factory.relations.values():
+        assert relation_to_primitive(relation) == as_model(Relation, relation).to_primitive(role="public")
+
+
+def test_health(factory):
+    for health in factory.health.values():
+        assert health_to_primitive(health) == as_model(HealthCheckState, health).to_primitive(role="public")
+
+
+def test_events(factory):
+    for event in factory.events:
+        # Schematics only converts timezone aware timestamps, but exports naive ones.
+        model = Event(attr.asdict(event, filter=lambda a, _: a.name != "timestamp"))
+        model.timestamp = event.timestamp
+        assert event_to_primitive(event) == model.to_primitive(role="public")
+
+
+def test_empty_records():
+    for record, model_class, serializer in [
+        (elements.Component(), Component, component_to_primitive),
+        (elements.ComponentProperties(), ComponentProperties, properties_to_primitive),
+        (elements.Relation(), Relation, relation_to_primitive),
+        (elements.HealthCheckState(), HealthCheckState, health_to_primitive),
+        (elements.Event(), Event, event_to_primitive),
+    ]:
+        assert serializer(record) == model_class().to_primitive(role="public")
+
+
+def test_invalid_health_is_rejected():
+    health = elements.HealthCheckState(check_id="a", check_name="a", topo_identifier="a", health="UNKNOWN")
+    with pytest.raises(Exception, match="must be one of"):
+        health.validate()
+
+
+def test_empty_elements():
+    for element, serializer in [
+        (Component(), component_to_primitive),
+        (Relation(), relation_to_primitive),
+        (HealthCheckState(), health_to_primitive),
+        (Event(), event_to_primitive),
+    ]:
+        assert serializer(element) == element.to_primitive(role="public")
+
+
+def test_none_and_empty_values():
+    component = Component()
+    component.uid = "urn:host:a"
+    component.set_type("Host")
+    component.properties.labels = ["a", None]
+    component.properties.identifiers = None
+    component.properties.custom_properties = {"a": None, "b": {}, "c": [None], "d": {"e": [1, 2.5]}}
+    assert component_to_primitive(component) == component.to_primitive(role="public")
+
+    event = Event()
+    event.timestamp = datetime(2022, 5, 1, 10, 30, 15, 600000)
+    event.context.category = "Changes"
+    event.context.source = None
+    event.context.data = {"old": {"a": None}, "new": {}, "x": None, "z": 0, "f": False, "s": ""}
+    event.context.element_identifiers = ["a", None]
+    event.context.source_links = [SourceLink({"title": "link"})]
+    assert event_to_primitive(event) == event.to_primitive(role="public")
+
+    event.context.data = {"x": None}
+    event.context.element_identifiers = [None]
+    event.context.source_links = []
+    assert event_to_primitive(event) == event.to_primitive(role="public")
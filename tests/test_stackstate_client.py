@@ -0,0 +1,400 @@
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+import attr
+import pytest
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.model.factory import (StreamingTopologyFactory,
+                                             TopologyFactory)
+from static_topo_impl.model.instance import StackStateSpec
+from static_topo_impl.model.stackstate_receiver import SyncStats
+from static_topo_impl.stackstate import StackStateClient
+from static_topo_impl.stackstate.encoder import (FLUSH_SIZE, RawJson,
+                                                 deflate_json, encode_element)
+from static_topo_impl.stackstate.sync_state import TopologySyncState
+
+
+def stackstate_spec(**kwargs) -> StackStateSpec:
+    spec = StackStateSpec(
+        {
+            "receiver_url": "http://127.0.0.1:7077",
+            "api_key": "xxx",
+            "instance_type": "static_topo_dsl",
+            "instance_url": "test",
+            **kwargs,
+        }
+    )
+    spec.validate()
+    return spec
+
+
+def sample_factory() -> TopologyFactory:
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.model_from_file("tests/resources/conf.d/static_topology_dsl.d/sample.topo")
+    return interpreter.interpret(model)
+
+
+def publish_dry_run(client: StackStateClient, factory: TopologyFactory) -> SyncStats:
+    components = list(factory.components.values())
+    relations = list(factory.relations.values())
+    return client.publish(components, relations, dry_run=True, stats=SyncStats())
+
+
+def test_deflate_json_matches_json_dumps():
+    value = {"a": [1, 2.5, None, True], "b": {}, "c": [], "d": {"e": "fé"}, "g": encode_element({"h": [1]})}
+    compressed = deflate_json(value)
+    expected = json.dumps(json.loads(json.dumps(value, default=RawJson.decode)))
+    assert zlib.decompress(b"".join(compressed)).decode("utf-8") == expected
+    assert compressed.raw_size == len(expected)
+
+
+def test_deflate_json_digests_chunks():
+    value = {"elements": [encode_element({"id": f"element-{i}", "data": "x" * 100}) for i in range(2000)]}
+    compressed = deflate_json(value)
+    zipped = b"".join(compressed)
+    assert len(compressed.chunks) > 1 and max(len(chunk) for chunk in compressed.chunks) < len(zipped)
+    assert len(compressed) == len(zipped)
+    assert compressed.md5 == md5(zipped).hexdigest()
+    assert compressed.raw_size > FLUSH_SIZE
+    assert json.loads(zlib.decompress(zipped)) == json.loads(json.dumps(value, default=RawJson.decode))
+
+
+def test_publish_single_snapshot():
+    factory = sample_factory()
+    stats = publish_dry_run(StackStateClient(stackstate_spec()), factory)
+    assert len(stats.payloads) == 1
+    topology = json.loads(stats.payloads[0])["topologies"][0]
+    assert topology["start_snapshot"] is True
+    assert topology["stop_snapshot"] is True
+    assert [c["externalId"] for c in topology["components"]] == list(factory.components.keys())
+    assert [r["externalId"] for r in topology["relations"]] == list(factory.relations.keys())
+
+
+def test_publish_batches_by_element_count():
+    factory = sample_factory()
+    stats = publish_dry_run(StackStateClient(stackstate_spec(max_batch_elements=2)), factory)
+    topologies = [json.loads(payload)["topologies"][0] for payload in stats.payloads]
+    assert [len(t["components"]) + len(t["relations"]) for t in topologies] == [2, 2, 1]
+    assert [t["start_snapshot"] for t in topologies] == [True, False, False]
+    assert [t["stop_snapshot"] for t in topologies] == [False, False, True]
+    assert stats.components == 3
+    assert stats.relations == 2
+
+
+def test_publish_batches_by_bytes():
+    factory = sample_factory()
+    stats = publish_dry_run(StackStateClient(stackstate_spec(max_batch_bytes=1)), factory)
+    assert len(stats.payloads) == 5
+
+
+def test_batches_are_built_as_they_are_posted():
+    client = StackStateClient(stackstate_spec(max_batch_elements=2))
+    taken: List[int] = []
+
+    def components():
+        for i in range(6):
+            taken.append(i)
+            yield encode_element({"externalId": f"c{i}"})
+
+    payloads = client._prepare_topo_payloads(components(), iter([]), [], snapshot=True)
+    assert next(payloads)["topologies"][0]["start_snapshot"] is True
+    # The first batch and the one after it, to know that the first is not the last.
+    assert taken == [0, 1, 2, 3, 4]
+    assert [p["topologies"][0]["stop_snapshot"] for p in payloads] == [False, True]
+
+
+class StubReceiver(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    statuses: List[int] = []
+    requests: List[Tuple[int, Dict[str, Any]]] = []
+    # When each recorded request arrived and was answered, by position in requests.
+    spans: List[Tuple[float, float]] = []
+    latency = 0.0
+
+    def do_POST(self):
+        # Requests that outlive their test, after a client timeout, are not recorded with the next test.
+        requests, spans = self.requests, self.spans
+        start = time.perf_counter()
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.latency)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if self.headers["Content-MD5"] != md5(body).hexdigest() or "Transfer-Encoding" in self.headers:
+            status = 400
+        requests.append((self.client_address[1], json.loads(zlib.decompress(body))))
+        spans.append((start, time.perf_counter()))
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+    StubReceiver.statuses = []
+    StubReceiver.requests = []
+    StubReceiver.spans = []
+    StubReceiver.latency = 0.0
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def receiver_spec(server, **kwargs) -> StackStateSpec:
+    retry = {"max_retries": 2, "backoff_seconds": 0.01}
+    return stackstate_spec(receiver_url=f"http://127.0.0.1:{server.server_port}", retry=retry, **kwargs)
+
+
+def test_publish_reuses_connection(receiver):
+    factory = sample_factory()
+    client = StackStateClient(receiver_spec(receiver, max_batch_elements=2))
+    stats = client.publish(list(factory.components.values()), list(factory.relations.values()), stats=SyncStats())
+    client.publish_events(factory.events, stats=stats)
+    assert stats.requests == 4
+    assert stats.retries == 0
+    assert len(stats.request_latencies_ms) == 4
+    assert len({port for port, _ in StubReceiver.requests}) == 1
+    assert StubReceiver.requests[0][1]["topologies"][0]["start_snapshot"] is True
+
+
+def test_publish_retries_server_errors(receiver):
+    StubReceiver.statuses = [503, 502]
+    factory = sample_factory()
+    client = StackStateClient(receiver_spec(receiver))
+    stats = client.publish_events(factory.events, stats=SyncStats())
+    assert stats.requests == 3
+    assert stats.retries == 2
+    assert len(StubReceiver.requests) == 3
+
+
+def test_publish_gives_up_after_max_retries(receiver):
+    StubReceiver.statuses = [500, 500, 500]
+    factory = sample_factory()
+    client = StackStateClient(receiver_spec(receiver))
+    stats = SyncStats()
+    with pytest.raises(Exception, match="Status code 500"):
+        client.publish_events(factory.events, stats=stats)
+    assert stats.retries == 2
+
+
+def test_publish_does_not_retry_client_errors(receiver):
+    StubReceiver.statuses = [400]
+    factory = sample_factory()
+    client = StackStateClient(receiver_spec(receiver))
+    stats = SyncStats()
+    with pytest.raises(Exception, match="Status code 400"):
+        client.publish_events(factory.events, stats=stats)
+    assert stats.requests == 1
+
+
+def test_publish_retries_connection_errors():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+    server.server_close()
+    client = StackStateClient(receiver_spec(server))
+    stats = SyncStats()
+    with pytest.raises(Exception, match="after 3 attempts"):
+        client.publish_events([], stats=stats)
+    assert stats.retries == 2
+
+
+def test_publish_times_out_on_hung_receiver(receiver):
+    StubReceiver.latency = 0.5
+    with StackStateClient(receiver_spec(receiver, read_timeout_seconds=0.05)) as client:
+        stats = SyncStats()
+        with pytest.raises(Exception, match="after 3 attempts"):
+            client.publish_events([], stats=stats)
+    assert stats.retries == 2
+
+
+def test_delta_sync_sends_only_changes():
+    factory = sample_factory()
+    client = StackStateClient(stackstate_spec(delta_sync=True), TopologySyncState())
+    stats = publish_dry_run(client, factory)
+    assert json.loads(stats.payloads[0])["topologies"][0]["start_snapshot"] is True
+
+    stats = publish_dry_run(client, factory)
+    assert stats.payloads == []
+    assert stats.changed_components == 0
+
+    factory.get_component("test2").properties.layer = "changed"
+    del factory.components["test3"]
+    del factory.relations["urn:host:test --> test3"]
+    stats = publish_dry_run(client, factory)
+    topology = json.loads(stats.payloads[0])["topologies"][0]
+    assert topology["start_snapshot"] is False
+    assert topology["stop_snapshot"] is False
+    assert [c["externalId"] for c in topology["components"]] == ["test2"]
+    assert topology["relations"] == []
+    assert topology["delete_ids"] == ["test3", "urn:host:test --> test3"]
+    assert (stats.changed_components, stats.changed_relations, stats.deleted) == (1, 0, 2)
+
+
+def test_delta_sync_sends_full_snapshot_on_interval():
+    factory = sample_factory()
+    client = StackStateClient(stackstate_spec(delta_sync=True, full_snapshot_interval_seconds=0), TopologySyncState())
+    publish_dry_run(client, factory)
+    stats = publish_dry_run(client, factory)
+    topology = json.loads(stats.payloads[0])["topologies"][0]
+    assert topology["start_snapshot"] is True
+    assert len(topology["components"]) == 3
+
+
+def test_nothing_is_fingerprinted_without_delta_or_skip():
+    factory = sample_factory()
+    state = TopologySyncState()
+    client = StackStateClient(stackstate_spec(health_sync={"stream_id": "test"}), state)
+    stats = publish_dry_run(client, factory)
+    client.publish_health_checks(list(factory.health.values()), dry_run=True, stats=stats)
+    client.publish_events(factory.events, dry_run=True, stats=stats)
+    assert len(stats.payloads) == 3
+    assert (state.components, state.relations, state.digests) == ({}, {}, {})
+
+
+def test_unchanged_channels_are_skipped_until_refresh():
+    factory = sample_factory()
+    spec = stackstate_spec(skip_unchanged=True, force_refresh_cycles=3, health_sync={"stream_id": "test"})
+    client = StackStateClient(spec, TopologySyncState())
+    health = list(factory.health.values())
+
+    def publish_cycle() -> SyncStats:
+        stats = publish_dry_run(client, factory)
+        client.publish_health_checks(health, dry_run=True, stats=stats)
+        # Events are stamped on every interpretation, which must not count as a change.
+        factory.events[0].timestamp = datetime.now() + timedelta(seconds=len(stats.payloads))
+        return client.publish_events(factory.events, dry_run=True, stats=stats)
+
+    stats = publish_cycle()
+    assert (stats.channels_sent, stats.channels_skipped, len(stats.payloads)) == (3, 0, 3)
+    stats = publish_cycle()
+    assert (stats.channels_sent, stats.channels_skipped, len(stats.payloads)) == (0, 3, 0)
+    stats = publish_cycle()
+    assert (stats.channels_sent, stats.channels_skipped) == (0, 3)
+    stats = publish_cycle()
+    assert (stats.channels_sent, stats.channels_skipped) == (3, 0)
+
+    factory.get_component("test2").properties.layer = "changed"
+    stats = publish_cycle()
+    assert (stats.channels_sent, stats.channels_skipped) == (1, 2)
+    assert "changed" in stats.payloads[0]
+
+
+def test_publish_all_posts_concurrently_in_order(receiver):
+    factory = sample_factory()
+    spec = receiver_spec(receiver, max_batch_elements=1, max_concurrency=4, health_sync={"stream_id": "test"})
+    StubReceiver.latency = 0.2
+    client = StackStateClient(spec)
+    stats = client.publish_all(
+        list(factory.components.values()),
+        list(factory.relations.values()),
+        list(factory.health.values()),
+        factory.events,
+        stats=SyncStats(),
+    )
+
+    # 5 topology batches, health and events. The 3 middle batches are in flight together, after the first and before
+    # the last one, and so are the health and event payloads.
+    assert stats.requests == 7
+    payloads = [payload for _, payload in StubReceiver.requests]
+    spans = StubReceiver.spans
+    topologies = [payload["topologies"][0] for payload in payloads[:5]]
+    assert topologies[0]["start_snapshot"] is True
+    assert topologies[-1]["stop_snapshot"] is True
+    assert not any(t["start_snapshot"] or t["stop_snapshot"] for t in topologies[1:-1])
+    assert all(len(payload["health"]) + len(payload["events"]) > 0 for payload in payloads[5:])
+
+    def overlapping(group: List[Tuple[float, float]]) -> bool:
+        return max(start for start, _ in group) < min(end for _, end in group)
+
+    assert overlapping(spans[1:4]) and overlapping(spans[5:])
+    assert spans[0][1] <= min(start for start, _ in spans[1:4])
+    assert max(end for _, end in spans[1:4]) <= spans[4][0]
+
+
+def test_stream_matches_published_snapshot():
+    spec = stackstate_spec(max_batch_elements=2, health_sync={"stream_id": "test"})
+    expected = publish_dry_run(StackStateClient(spec), sample_factory())
+    expected_topology = [json.loads(p)["topologies"][0] for p in expected.payloads]
+
+    stream = StackStateClient(spec).stream(dry_run=True, stats=SyncStats())
+    factory = StreamingTopologyFactory(stream)
+    interpreter = TopologyInterpreter(factory)
+    interpreter.interpret(interpreter.model_from_file("tests/resources/conf.d/static_topology_dsl.d/sample.topo"))
+    stats = stream.close()
+
+    assert factory.components == {}
+    assert factory.get_component_by_name("test2").uid == "test2"
+    assert (stats.components, stats.relations, stats.checks) == (3, 2, 3)
+    payloads = [json.loads(p) for p in stats.payloads]
+    topology = [p["topologies"][0] for p in payloads if p["topologies"]]
+    markers = [(t["start_snapshot"], t["stop_snapshot"]) for t in topology]
+    assert markers == [(True, False), (False, False), (False, True)]
+    for key in ("components", "relations"):
+        assert [e for t in topology for e in t[key]] == [e for t in expected_topology for e in t[key]]
+    # Health goes out in batches of its own snapshot, which is stopped after the topology snapshot.
+    health = [p["health"][0] for p in payloads if p["health"]]
+    assert [("start_snapshot" in h, "stop_snapshot" in h) for h in health] == [(True, False), (False, True)]
+    assert [len(h["check_states"]) for h in health] == [2, 1]
+    assert payloads[-1]["health"]
+
+
+def test_stream_posts_middle_batches_concurrently(receiver, caplog):
+    spec = receiver_spec(
+        receiver, max_batch_elements=1, max_concurrency=4, delta_sync=True, health_sync={"stream_id": "test"}
+    )
+    StubReceiver.latency = 0.1
+    with StackStateClient(spec, TopologySyncState()) as client:
+        stream = client.stream(stats=SyncStats())
+        interpreter = TopologyInterpreter(StreamingTopologyFactory(stream))
+        interpreter.interpret(interpreter.model_from_file("tests/resources/conf.d/static_topology_dsl.d/sample.topo"))
+        stats = stream.close()
+    assert "do not apply to streaming" in caplog.text
+
+    assert stats.requests == 8
+    # Only the topology snapshot is checked, its five batches interleave with the three health batches.
+    posted = [(payload, span) for (_, payload), span in zip(StubReceiver.requests, StubReceiver.spans)]
+    topologies = [payload["topologies"][0] for payload, _ in posted if payload["topologies"]]
+    spans = [span for payload, span in posted if payload["topologies"]]
+    assert [(t["start_snapshot"], t["stop_snapshot"]) for t in (topologies[0], topologies[-1])] == [
+        (True, False),
+        (False, True),
+    ]
+    assert max(start for start, _ in spans[1:4]) < min(end for _, end in spans[1:4])
+    assert spans[0][1] <= min(start for start, _ in spans[1:4])
+    assert max(end for _, end in spans[1:4]) <= spans[4][0]
+
+
+def test_stream_keeps_the_last_state_of_a_check():
+    client = StackStateClient(stackstate_spec(health_sync={"stream_id": "test"}))
+    stream = client.stream(dry_run=True, stats=SyncStats())
+    factory = sample_factory()
+    first, second = list(factory.health.values())[:2]
+    stream.add_health(first)
+    stream.add_health(second)
+    stream.add_health(attr.evolve(first, message="replaced"))
+    stats = stream.close()
+    assert stats.checks == 2
+    check_states = json.loads(stats.payloads[-1])["health"][0]["check_states"]
+    assert [c["checkStateId"] for c in check_states] == [first.check_id, second.check_id]
+    assert check_states[0]["message"] == "replaced"
+
+
+def test_aborted_stream_leaves_snapshot_open(caplog):
+    stream = StackStateClient(stackstate_spec(max_batch_elements=1)).stream(dry_run=True, stats=SyncStats())
+    for component in sample_factory().components.values():
+        stream.add_component(component)
+    stream.abort()
+    topologies = [json.loads(payload)["topologies"][0] for payload in stream.stats.payloads]
+    assert [(t["start_snapshot"], t["stop_snapshot"]) for t in topologies] == [(True, False), (False, False)]
+    assert "partial snapshot is left open" in caplog.text
+
@@ -1,8 +1,14 @@
 from static_topology_dsl import StaticTopologyDslCheck
+from static_topo_impl.agent_processor import AgentProcessor
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.model.factory import TopologyFactory
 from static_topo_impl.model.instance import InstanceInfo
+from static_topo_impl.model.serializers import event_to_primitive, properties_to_primitive
+from stackstate_checks.base import Health
 from stackstate_checks.stubs import topology
+import pytest
 import yaml
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import logging
 
 logging.basicConfig()
@@ -35,6 +41,61 @@ def test_static_topology():
     assert_relation(relations, host_id, host3_id)
 
 
+# Records the calls an AgentProcessor makes on its agent check, in order.
+class RecordingCheck:
+    def __init__(self, calls: List[Tuple[Any, ...]], prefix: str = ""):
+        self.calls = calls
+        self.prefix = prefix
+        self.log = logging.getLogger("recording_check")
+
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: self.calls.append((self.prefix + name, *args, *kwargs.values()))
+
+
+def baseline_calls(instance: InstanceInfo) -> List[Tuple[Any, ...]]:
+    # What the agent check was sent before emission was batched: the topology snapshot with components and then
+    # relations, the health snapshot and the events.
+    interpreter = TopologyInterpreter(TopologyFactory())
+    for topo_file in instance.topo_files:
+        interpreter.interpret(interpreter.model_from_file(topo_file))
+    factory = interpreter.factory
+    calls: List[Tuple[Any, ...]] = [("start_snapshot",)]
+    for c in factory.components.values():
+        c.properties.dedup_labels()
+        calls.append(("component", c.uid, c.get_type(), properties_to_primitive(c.properties)))
+    for r in factory.relations.values():
+        calls.append(("relation", r.source_id, r.target_id, r.get_type(), r.properties))
+    calls += [("stop_snapshot",), ("health.start_snapshot",)]
+    for h in factory.health.values():
+        calls.append(("health.check_state", h.check_id, h.check_name, Health[h.health], h.topo_identifier, h.message))
+    calls.append(("health.stop_snapshot",))
+    calls += [("event", event_to_primitive(e)) for e in factory.events]
+    return calls
+
+
+def without_timestamps(calls: List[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    # Events are stamped when they are interpreted.
+    return [(name, dict(args[0], timestamp=None)) if name == "event" else (name, *args) for name, *args in calls]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_agent_check_calls_match_baseline(streaming):
+    instance = InstanceInfo(dict(setup_test_instance(), streaming=streaming, profile=True))
+    instance.validate()
+    calls: List[Tuple[Any, ...]] = []
+    check = RecordingCheck(calls)
+    check.health = RecordingCheck(calls, "health.")
+    AgentProcessor(instance, check).process()
+
+    emitted = [call for call in calls if call[0] != "gauge"]
+    assert without_timestamps(emitted) == without_timestamps(baseline_calls(instance))
+
+    gauges = [call for call in calls if call[0] == "gauge"]
+    stages = {tags[0] for _, name, _, tags in gauges if name == "static_topology.stage.seconds"}
+    assert {"stage:discovery", "stage:parse", "stage:serialization", "stage:emission"} <= stages
+    assert stages == {tags[0] for _, name, _, tags in gauges if name == "static_topology.stage.count"}
+
+
 def setup_test_instance() -> Dict[str, Any]:
     with open("tests/resources/conf.d/static_topology_dsl.d/conf.yaml.example") as f:
         config = yaml.load(f)
@@ -0,0 +1,130 @@
+import logging
+import shutil
+
+import pytest
+from static_topo_impl.dsl.interpreter import TopologyInterpreter
+from static_topo_impl.dsl.topology_cache import TopologyCache
+from static_topo_impl.model.factory import TopologyFactory
+
+SAMPLE = "tests/resources/conf.d/static_topology_dsl.d/sample.topo"
+log = logging.getLogger(__name__)
+
+
+def interpret(cache: TopologyCache, topo_files) -> TopologyFactory:
+    interpreter = TopologyInterpreter(TopologyFactory())
+    return cache.interpret(interpreter, topo_files, log)
+
+
+def test_unchanged_files_are_reused(tmp_path):
+    first = str(tmp_path / "first.topo")
+    second = str(tmp_path / "second.topo")
+    shutil.copy(SAMPLE, first)
+    with open(second, "w") as f:
+        f.write("components {\n  Host(id other, name other, relations [test])\n}\n")
+
+    cache = TopologyCache()
+    factory = interpret(cache, [first, second])
+    model = cache.files[first].model
+    assert len(factory.components) == 4
+    assert len(factory.relations) == 3
+
+    factory = interpret(cache, [first, second])
+    assert cache.files[first].model is model
+    assert len(factory.components) == 4
+    assert len(factory.relations) == 3
+    assert len(factory.health) == 4
+    assert len(factory.events) == 1
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    first = str(tmp_path / "first.topo")
+    second = str(tmp_path / "second.topo")
+    shutil.copy(SAMPLE, first)
+    with open(second, "w") as f:
+        f.write("components {\n  Host(id other, name other)\n}\n")
+
+    cache = TopologyCache()
+    interpret(cache, [first, second])
+    first_model = cache.files[first].model
+    second_model = cache.files[second].model
+
+    with open(second, "w") as f:
+        f.write("components {\n  Host(id other, name other)\n  Host(id more, name more)\n}\n")
+    factory = interpret(cache, [first, second])
+    assert cache.files[first].model is first_model
+    assert cache.files[second].model is not second_model
+    assert "more" in factory.components
+
+
+def test_reordered_files_are_interpreted_again(tmp_path):
+    first = str(tmp_path / "first.topo")
+    second = str(tmp_path / "second.topo")
+    shutil.copy(SAMPLE, first)
+    with open(second, "w") as f:
+        f.write("components {\n  Host(id other, name other)\n}\n")
+
+    cache = TopologyCache()
+    interpret(cache, [first, second])
+    factory = interpret(cache, [second, first])
+    assert list(factory.components.keys())[0] == "other"
+    assert len(factory.components) == 4
+
+
+def test_parallel_workers_match_sequential(tmp_path):
+    first = str(tmp_path / "first.topo")
+    second = str(tmp_path / "second.topo")
+    shutil.copy(SAMPLE, first)
+    with open(second, "w") as f:
+        f.write("components {\n  Host(id other, name other, relations [test])\n}\n")
+
+    sequential = interpret(TopologyCache(), [first, second])
+    cache = TopologyCache()
+    parallel = cache.interpret(TopologyInterpreter(TopologyFactory()), [first, second], log, workers=2)
+    assert list(parallel.components.keys()) == list(sequential.components.keys())
+    assert list(parallel.relations.keys()) == list(sequential.relations.keys())
+    assert list(parallel.health.keys()) == list(sequential.health.keys())
+    assert parallel.events[0].context.element_identifiers == sequential.events[0].context.element_identifiers
+    partial = cache.files[first].partial
+
+    again = cache.interpret(TopologyInterpreter(TopologyFactory()), [first, second], log, workers=2)
+    assert cache.files[first].partial is partial
+    assert list(again.relations.keys()) == list(sequential.relations.keys())
+
+
+def test_parallel_workers_detect_duplicate_components(tmp_path):
+    first = str(tmp_path / "first.topo")
+    second = str(tmp_path / "second.topo")
+    shutil.copy(SAMPLE, first)
+    with open(second, "w") as f:
+        f.write("components {\n  Host(id test2, name other)\n}\n")
+
+    with pytest.raises(Exception, match="Component 'test2' already exists."):
+        TopologyCache().interpret(TopologyInterpreter(TopologyFactory()), [first, second], log, workers=2)
+
+
+def test_processor_changes_to_earlier_files_are_not_repeated(tmp_path):
+    first = str(tmp_path / "first.topo")
+    second = str(tmp_path / "second.topo")
+    with open(first, "w") as f:
+        f.write("components {\n  Host(name a, labels ['base'])\n}\n")
+
+    def write_second(name):
+        with open(second, "w") as f:
+            f.write(
+                "components {\n"
+                f"  Host(name {name}, processor ```\n"
+                "    factory.get_component('urn:host:a').properties.add_label('from-b')\n"
+                "  ```)\n"
+                "}\n"
+            )
+
+    write_second("b")
+    cache = TopologyCache()
+    factory = interpret(cache, [first, second])
+    assert factory.get_component("urn:host:a").properties.labels == ["base", "from-b"]
+
+    for name in ["b", "c", "c"]:
+        write_second(name)
+        factory = interpret(cache, [first, second])
+        assert factory.get_component("urn:host:a").properties.labels == ["base", "from-b"]
+    assert cache.order == []
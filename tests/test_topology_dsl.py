@@ -1,5 +1,7 @@
+import pytest
 from static_topo_impl.dsl.interpreter import TopologyInterpreter
 from static_topo_impl.model.factory import TopologyFactory
+from textx import get_children_of_type
 
 
 def test_topology_dsl():
@@ -8,3 +10,157 @@ def test_topology_dsl():
     model = interpreter.model_from_file("tests/resources/conf.d/static_topology_dsl.d/sample.topo")
     factory = interpreter.interpret(model)
     assert len(factory.components.keys()) == 3
+
+
+def test_interpreters_share_metamodel():
+    first = TopologyInterpreter(TopologyFactory())
+    second = TopologyInterpreter(TopologyFactory())
+    assert first.topology_meta is second.topology_meta
+
+
+def test_code_blocks_do_not_share_variables():
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.topology_meta.model_from_str(
+        """
+        components {
+          Host(name first, processor ```leaked = 1```)
+          Host(name second, data { seen ```leaked``` })
+        }
+        """
+    )
+    with pytest.raises(Exception, match="name 'leaked' is not defined"):
+        interpreter.interpret(model)
+
+
+def test_repeat_index_is_rebound():
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.topology_meta.model_from_str(
+        """
+        components {
+          Host(name ```"host-%d" % repeat_index```, repeat 3, data { index ```repeat_index``` })
+        }
+        """
+    )
+    factory = interpreter.interpret(model)
+    assert [c.properties.get_property("index") for c in factory.components.values()] == [0, 1, 2]
+
+
+def test_code_blocks_are_compiled_on_load():
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.model_from_file("tests/resources/conf.d/static_topology_dsl.d/sample.topo")
+    code_blocks = get_children_of_type("PropertyCode", model)
+    assert len(code_blocks) == 4
+    assert all(code.compiled.tree is not None for code in code_blocks)
+    assert code_blocks[0].compiled.expression.startswith('"urn:%s:%s"')
+
+
+def test_constant_properties_are_folded_and_copied():
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.model_from_file("tests/resources/conf.d/static_topology_dsl.d/sample.topo")
+    data = model.defaults.properties[5].value
+    assert data.constant is True
+    assert data.constant_value == {"myprop": "myvalue", "myarr": ["test"]}
+    labels = model.components.components[0].properties[3].value
+    assert labels.constant is False
+
+    factory = interpreter.interpret(model)
+    first, second = list(factory.components.values())[:2]
+    first.properties.get_property("myarr").append("changed")
+    assert second.properties.get_property("myarr") == ["test"]
+    assert data.constant_value == {"myprop": "myvalue", "myarr": ["test"]}
+
+
+def test_relation_errors_are_reported_together():
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.topology_meta.model_from_str(
+        """
+        components {
+          Host(id a, name shared)
+          Host(id b, name shared)
+          Host(id c, name other, relations [missing, shared, a, a])
+          Host(id d, name last, relations [other, "<b"])
+        }
+        """
+    )
+    with pytest.raises(Exception) as error:
+        interpreter.interpret(model)
+    message = str(error.value)
+    assert message.startswith("Failed to resolve 3 relation(s):")
+    assert "Failed to find related component 'missing'. Reference from component c." in message
+    assert "Related component 'shared' is ambiguous, it matches a, b." in message
+    assert "Relation 'c --> a' already exists." in message
+
+
+def test_relations_resolve_by_uid_and_name():
+    interpreter = TopologyInterpreter(TopologyFactory())
+    model = interpreter.topology_meta.model_from_str(
+        """
+        components {
+          Host(id a, name first, relations [second, "<b|runs"])
+          Host(id b, name second)
+        }
+        """
+    )
+    factory = interpreter.interpret(model)
+    assert list(factory.relations.keys()) == ["a --> b", "b --> a"]
+    assert factory.relations["b --> a"].get_type() == "runs"
+    assert factory.get_component("a").relations == []
+
+
+def test_events_on_worker_threads_match_sequential():
+    events = "\n".join(
+        f"""
+          ElementPropertiesChanged(
+            title "patched {i}"
+            message ```"%s patched %d" % (factory.get_component_by_name("host-{i % 3}").uid, {i})```
+            identifiers [ "host-{i % 3}", "urn:host:elsewhere" ]
+            previous {{ version "1" }}
+            current {{ version ```str({i})``` }}
+          )"""
+        for i in range(20)
+    )
+    source = f"""
+        components {{
+          Host(name ```"host-%d" % repeat_index```, repeat 3)
+        }}
+        events {{ {events} }}
+        """
+    results = []
+    for event_workers in [0, 4]:
+        interpreter = TopologyInterpreter(TopologyFactory(), event_workers=event_workers)
+        factory = interpreter.interpret(interpreter.topology_meta.model_from_str(source))
+        assert {event.timestamp for event in factory.events} == {interpreter.timestamp}
+        results.append([(e.msg_text, e.context.element_identifiers, e.context.data) for e in factory.events])
+    assert results[0] == results[1]
+    assert results[0][4] == (
+        "urn:host:host-1 patched 4",
+        ["urn:host:host-1", "urn:host:elsewhere"],
+        {"old": {"version": "1"}, "new": {"version": "4"}},
+    )
+
+
+@pytest.mark.parametrize("event_workers", [1, 2])
+def test_event_processors_see_resolved_identifiers(event_workers):
+    interpreter = TopologyInterpreter(TopologyFactory(), event_workers=event_workers)
+    model = interpreter.topology_meta.model_from_str(
+        """
+        components {
+          Host(name a)
+        }
+        events {
+          ElementPropertiesChanged(
+            title first
+            identifiers [a, unknown]
+            processor ```event.tags.extend(event.context.element_identifiers)```
+          )
+          ElementPropertiesChanged(
+            title second
+            identifiers [a]
+            processor ```event.tags.extend(event.context.element_identifiers)```
+          )
+        }
+        """
+    )
+    factory = interpreter.interpret(model)
+    assert [e.context.element_identifiers for e in factory.events] == [["urn:host:a", "unknown"], ["urn:host:a"]]
+    assert [e.tags for e in factory.events] == [["urn:host:a", "unknown"], ["urn:host:a"]]
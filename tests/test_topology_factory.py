@@ -0,0 +1,140 @@
+import pytest
+from static_topo_impl.model.elements import Component, HealthCheckState
+from static_topo_impl.model.factory import (StreamingTopologyFactory,
+                                            TopologyFactory, TopologySink)
+
+
+def new_component(uid: str, component_type: str, name: str) -> Component:
+    component = Component()
+    component.uid = uid
+    component.set_type(component_type)
+    component.set_name(name)
+    return component
+
+
+def test_lookup_by_name_and_type():
+    factory = TopologyFactory()
+    factory.add_component(new_component("urn:host:a", "Host", "a"))
+    factory.add_component(new_component("urn:app:a", "Application", "a"))
+    factory.add_component(new_component("urn:host:b", "Host", "b"))
+
+    assert factory.get_component_by_name("b").uid == "urn:host:b"
+    assert factory.get_component_by_name_and_type("Host", "a").uid == "urn:host:a"
+    assert factory.get_component_by_name_and_type("Application", "a").uid == "urn:app:a"
+    assert factory.get_component_by_name("c", raise_not_found=False) is None
+    assert factory.get_component_by_name_and_type("Host", "c", raise_not_found=False) is None
+    with pytest.raises(Exception, match="not found"):
+        factory.get_component_by_name("c")
+
+
+def test_ambiguous_lookup():
+    factory = TopologyFactory()
+    factory.add_component(new_component("urn:host:a", "Host", "a"))
+    factory.add_component(new_component("urn:app:a", "Application", "a"))
+    factory.add_component(new_component("urn:app:a2", "Application", "a"))
+
+    with pytest.raises(Exception, match="More than 1 result"):
+        factory.get_component_by_name("a")
+    with pytest.raises(Exception, match="More than 1 result"):
+        factory.get_component_by_name_and_type("Application", "a")
+    with pytest.raises(Exception, match="already exists"):
+        factory.add_component(new_component("urn:host:a", "Host", "a"))
+
+
+def test_queries_by_type_and_label():
+    factory = TopologyFactory()
+    a = new_component("urn:host:a", "Host", "a")
+    a.properties.labels.extend(["env:prod", "env:prod"])
+    factory.add_component(a)
+    factory.add_component(new_component("urn:app:a", "Application", "a"))
+
+    hosts = factory.components_by_type("Host")
+    assert [c.uid for c in hosts] == ["urn:host:a"]
+    assert factory.components_by_type("Host") is hosts
+    assert [c.uid for c in factory.components_by_label("env:prod")] == ["urn:host:a"]
+    assert factory.components_by_type("Database") == ()
+
+    # Adding a component only invalidates the memoized results of its type and labels.
+    applications = factory.components_by_type("Application")
+    b = new_component("urn:host:b", "Host", "b")
+    b.properties.labels.append("env:prod")
+    factory.add_component(b)
+    assert [c.uid for c in factory.components_by_type("Host")] == ["urn:host:a", "urn:host:b"]
+    assert [c.uid for c in factory.components_by_label("env:prod")] == ["urn:host:a", "urn:host:b"]
+    assert factory.components_by_type("Application") is applications
+
+    # Labels are indexed when a component is added, a label added afterwards is not found.
+    a.properties.add_label("env:test")
+    assert factory.components_by_label("env:test") == ()
+
+
+def new_health(check_id: str, topo_identifier: str, health: str) -> HealthCheckState:
+    return HealthCheckState(
+        check_id=check_id, check_name="HealthCheck", topo_identifier=topo_identifier, health=health, message=""
+    )
+
+
+def test_health_store_indexes():
+    factory = TopologyFactory()
+    factory.add_health(new_health("a", "urn:host:a", "CLEAR"))
+    factory.add_health(new_health("b", "urn:host:b", "CRITICAL"))
+    factory.add_health(new_health("b2", "urn:host:b", "DEVIATING"))
+    factory.add_health(new_health("c", "urn:host:c", "CRITICAL"))
+
+    health = factory.health
+    assert health.counts() == {"CLEAR": 1, "DEVIATING": 1, "CRITICAL": 2}
+    assert [h.check_id for h in health.with_state("CRITICAL")] == ["b", "c"]
+    assert [h.check_id for h in health.for_identifier("urn:host:b")] == ["b", "b2"]
+
+    # Replacing or removing a state keeps the indexes in line.
+    factory.add_health(new_health("b", "urn:host:b", "CLEAR"))
+    del health["c"]
+    assert health.counts() == {"CLEAR": 2, "DEVIATING": 1, "CRITICAL": 0}
+    assert health.with_state("CRITICAL") == []
+    assert health.for_identifier("urn:host:c") == []
+    assert list(health.keys()) == ["a", "b", "b2"]
+    assert dict(health) == {check_id: health[check_id] for check_id in ["a", "b", "b2"]}
+
+    # A state changed in place is indexed again once it is stored again.
+    changed = health["b2"]
+    changed.health = "CRITICAL"
+    changed.topo_identifier = "urn:host:c"
+    health["b2"] = changed
+    assert health.counts() == {"CLEAR": 2, "DEVIATING": 0, "CRITICAL": 1}
+    assert [h.check_id for h in health.for_identifier("urn:host:b")] == ["b"]
+    assert [h.check_id for h in health.for_identifier("urn:host:c")] == ["b2"]
+    del health["b2"]
+    assert health.counts() == {"CLEAR": 2, "DEVIATING": 0, "CRITICAL": 0}
+
+
+def test_incomplete_sink_is_rejected():
+    class ComponentSink(TopologySink):
+        def add_component(self, component: Component):
+            pass
+
+    with pytest.raises(TypeError, match="add_health"):
+        ComponentSink()
+
+
+def test_streaming_factory_keeps_only_the_name_index():
+    class DiscardingSink(TopologySink):
+        def add_component(self, component):
+            pass
+
+        def add_relation(self, relation):
+            pass
+
+        def add_health(self, health):
+            pass
+
+    factory = StreamingTopologyFactory(DiscardingSink())
+    factory.add_component(new_component("urn:host:a", "Host", "a"))
+    factory.add_component(new_component("urn:app:a", "Application", "a"))
+
+    assert factory.get_component_by_name_and_type("Application", "a").uid == "urn:app:a"
+    assert factory.get_component_by_name_and_type("Host", "b", raise_not_found=False) is None
+    with pytest.raises(Exception, match="More than 1 result"):
+        factory.get_component_by_name("a")
+    assert (factory.uids_by_type, factory.uids_by_label, factory.uids_by_type_and_name) == ({}, {}, {})
+    with pytest.raises(Exception, match="can not be queried by type when streaming"):
+        factory.components_by_type("Host")
@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+
+import pytest
+from static_topo_impl.cli.watcher import FileWatcher
+
+
+def write(path, content: str):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_changes_are_detected_once_settled(tmp_path, use_inotify):
+    conf = str(tmp_path / "conf.yaml")
+    topo_dir = tmp_path / "topologies"
+    topo_dir.mkdir()
+    write(conf, "topo_files: [topologies]\n")
+    write(topo_dir / "hosts.topo", "components {}\n")
+
+    watcher = FileWatcher(debounce=0.2, poll_interval=0.05, use_inotify=use_inotify)
+    try:
+        watcher.watch(conf, [str(topo_dir)])
+        assert not watcher.wait(0.1)
+
+        # Unrelated files never trigger a sync.
+        write(topo_dir / "notes.txt", "ignored\n")
+        assert not watcher.wait(0.2)
+
+        def edit():
+            for i in range(3):
+                write(topo_dir / f"new-{i}.topo", "components {}\n")
+                time.sleep(0.05)
+
+        editor = threading.Thread(target=edit)
+        start = time.monotonic()
+        editor.start()
+        assert watcher.wait(5)
+        editor.join()
+        # The burst is reported once, after the last edit settled.
+        assert time.monotonic() - start >= 0.3
+
+        watcher.watch(conf, [str(topo_dir)])
+        assert len(watcher.snapshot) == 5
+        os.remove(topo_dir / "hosts.topo")
+        assert watcher.wait(5)
+    finally:
+        watcher.close()